@@ -0,0 +1 @@
+default_app_config = 'bima_back.apps.BimaBackConfig'
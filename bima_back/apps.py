@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class BimaBackConfig(AppConfig):
     name = 'bima_back'
+
+    def ready(self):
+        from . import checks  # noqa
@@ -6,10 +6,11 @@ from constance import config
 import coreapi
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 
-from .utils import cache_set
+from .local_cache import tiered_get, tiered_set
+from .schemas import clear_user_schema, get_generated_schema_index, SchemaIndex
+from .transports import get_client
 from .constants import CACHE_USER_PROFILE_PREFIX_KEY, PRIVATE_API_SCHEMA_URL
 
 
@@ -30,25 +31,51 @@ class WSAuthenticationBackend(object):
         :return: user instance
         """
         # initialize client
-        client = coreapi.Client()
+        client = get_client()
         api_url = join(settings.WS_BASE_URL, PRIVATE_API_SCHEMA_URL)
-        schema = client.get(api_url)
+        schema_index = get_generated_schema_index() or SchemaIndex(client.get(api_url))
 
         # get user token
         params = {'username': username, 'password': password}
         try:
-            token = client.action(schema, ['api-token-auth', 'create'], params=params)['token']
+            token = schema_index.action(client, ['api-token-auth', 'create'], params=params)['token']
         except (coreapi.exceptions.ErrorMessage, KeyError):
             raise PermissionDenied()
 
+        user_params = self.load_user_profile(token)
+
+        # user model
+        user_model = get_user_model()
+        if user_params['is_staff']:
+            # save superusers in order to let them do actions in the admin site
+            # that need to register the log, for example, deleting a chunkedupload object
+            user_model.objects.update_or_create(
+                id=user_params['id'],
+                defaults={
+                    'username': user_params['username'],
+                    'is_staff': user_params['is_staff'],
+                    'admin': user_params['admin'],
+                    'is_superuser': user_params['is_superuser'],
+                }
+            )
+        return user_model(**user_params)
+
+    @staticmethod
+    def load_user_profile(token):
+        """
+        Requests the data of the user of an api token and stores it in cache, as the profile used by the service
+        clients of the user
+        :param token: api token
+        :return: user profile
+        """
         # initialize client with token
+        api_url = join(settings.WS_BASE_URL, PRIVATE_API_SCHEMA_URL)
         authorization = {'Authorization': 'Token {}'.format(token)}
-        transports = coreapi.transports.HTTPTransport(credentials=authorization, headers=authorization)
-        client = coreapi.Client(transports=[transports])
-        schema = client.get(api_url)
+        client = get_client(headers=authorization)
+        schema_index = get_generated_schema_index() or SchemaIndex(client.get(api_url))
 
         # get user data and save it in cache
-        user_data = client.action(schema, ['whoami', 'list'])
+        user_data = schema_index.action(client, ['whoami', 'list'])
         is_superuser = config.ADMIN_ID in user_data['groups'] or user_data['is_superuser']
         user_params = {
             'id': user_data['id'],
@@ -63,35 +90,22 @@ class WSAuthenticationBackend(object):
             'is_superuser': is_superuser,
             'permissions': user_data['permissions'],
         }
-        # store into cache the new user info
-        cache_set("{}_{}".format(CACHE_USER_PROFILE_PREFIX_KEY, user_data['id']), user_params)
+        # store into cache the new user info, and forget the schema of its previous permissions
+        tiered_set(CACHE_USER_PROFILE_PREFIX_KEY, "{}_{}".format(CACHE_USER_PROFILE_PREFIX_KEY, user_data['id']),
+                   user_params, invalidate=True)
+        clear_user_schema(user_data['id'])
         logger.debug(user_data['permissions'])
-
-        # user model
-        user_model = get_user_model()
-        if user_params['is_staff']:
-            # save superusers in order to let them do actions in the admin site
-            # that need to register the log, for example, deleting a chunkedupload object
-            user_model.objects.update_or_create(
-                id=user_params['id'],
-                defaults={
-                    'username': user_params['username'],
-                    'is_staff': user_params['is_staff'],
-                    'admin': user_params['admin'],
-                    'is_superuser': user_params['is_superuser'],
-                }
-            )
-        return user_model(**user_params)
+        return user_params
 
     def get_user(self, user_id):
         """
-        Get the user information from cache
+        Get the user information from cache, extending its timeout when it is read from the shared cache
         :param user_id:
         :return: user instance
         """
-        user_params = cache.get("{}_{}".format(CACHE_USER_PROFILE_PREFIX_KEY, user_id))
+        user_params = tiered_get(CACHE_USER_PROFILE_PREFIX_KEY, "{}_{}".format(CACHE_USER_PROFILE_PREFIX_KEY, user_id),
+                                 touch=True)
         if user_params:
-            cache_set("{}_{}".format(CACHE_USER_PROFILE_PREFIX_KEY, user_params['id']), user_params)
             return get_user_model()(**user_params)
         return None
 
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+from itertools import islice
 import logging
 
 from constance import config
@@ -58,6 +59,15 @@ class BaseSearchView(LoginRequiredMixin, ServiceClientMixin, View):
         action_kwargs.update(self.get_extra_action_kwargs())
         return client_action(**action_kwargs)
 
+    def iter_queryset(self, page=1):
+        """
+        Returns an iterator over the results of all the pages from the given one. Each page is requested when the
+        previous one is consumed, so the pages after the results needed by `paginate` are not requested.
+        """
+        action_kwargs = self.get_action_kwargs(page)
+        action_kwargs.update(self.get_extra_action_kwargs())
+        return self.get_client().iter_all(self.get_action_name(), prefetch=False, **action_kwargs)
+
     def get_paginate_by(self):
         """
         Returns pagination size
@@ -66,19 +76,15 @@ class BaseSearchView(LoginRequiredMixin, ServiceClientMixin, View):
         return page_size if page_size > 0 else 1
 
     def paginate(self, object_data):
-        results, iterations = object_data.get('results', []), 0
-        # trivial case: number of results less than page_size
+        results = object_data.get('results', [])
+        # trivial case: the first page has enough results or there are no more pages
         page_size = self.get_paginate_by()
-        if len(object_data.get('results', [])) <= page_size or not object_data.get('next', None):
-            return object_data
+        if len(results) >= page_size or not object_data.get('next', None):
+            return {'results': results[:page_size]}
         # need request more pages
-        while len(results) < page_size:
-            object_data = self.get_queryset(object_data.get('next'))
-            results.extend(object_data.get('results'))
-            iterations += 1
-            if iterations > config.AUTOCOMPLETE_PAGE_ITERATION:
-                logger.warning("Check the server pagination size and the autocomplete pagination size")
-        return {'results': results[:page_size]}
+        if len(results) * (config.AUTOCOMPLETE_PAGE_ITERATION + 1) < page_size:
+            logger.warning("Check the server pagination size and the autocomplete pagination size")
+        return {'results': results + list(islice(self.iter_queryset(page=2), page_size - len(results)))}
 
     def get_text_field(self):
         """
@@ -132,6 +138,7 @@ class PhotoSearchView(BaseSearchView):
 
 class CategorySearchView(BaseSearchView):
     action_name = 'get_categories_simple_list'
+    cache_namespaces = ('categories', )
     lookup_field = 'name'
     text_field = 'name'
 
@@ -173,4 +180,5 @@ class RestrictionSearchView(BaseSearchView):
 
 class TypeSearchView(BaseSearchView):
     action_name = 'get_photo_type_list'
+    cache_namespaces = ('types', )
     lookup_field = 'name'
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+import json
+import pickle
+import struct
+import threading
+import zlib
+
+from coreapi.codecs import CoreJSONCodec
+from coreapi.document import Document
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover
+    lz4_frame = None
+
+
+# The values stored with `utils.cache_set` are serialized by the WS_CACHE_SERIALIZER class (CompactSerializer by
+# default). Serialized values start with a header: a magic number, the header version, the format of the value and its
+# compression. Values without it, stored before, are returned as they are, so both coexist in cache during a rollout.
+
+HEADER = struct.Struct('>2sBBB')
+HEADER_MAGIC = b'\xbb\xca'
+HEADER_VERSION = 1
+
+FORMAT_JSON = 1
+FORMAT_COREJSON = 2
+FORMAT_PICKLE = 3
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_LZ4 = 2
+
+_serializers = {}
+
+# stored bytes by namespace (first part of the cache key) of the current process
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def is_plain_data(value):
+    """
+    Whether a value is kept as it is through json: dicts with string keys, lists, strings, numbers, booleans and None
+    """
+    value_type = type(value)
+    if value_type is dict:
+        return all(type(key) is str and is_plain_data(item) for key, item in value.items())
+    if value_type is list:
+        return all(is_plain_data(item) for item in value)
+    return value is None or value_type in (str, int, float, bool)
+
+
+class CompactSerializer(object):
+    """
+    Serializes plain data as json, coreapi documents as CoreJSON and the rest of the values with pickle. Values over
+    WS_CACHE_COMPRESS_MIN_SIZE bytes are compressed with WS_CACHE_COMPRESSION ('zlib', 'lz4' if installed, or None).
+    """
+
+    def __init__(self):
+        self.compress_min_size = getattr(settings, 'WS_CACHE_COMPRESS_MIN_SIZE', 1024)
+        self.compression = getattr(settings, 'WS_CACHE_COMPRESSION', 'zlib')
+        self.compression_level = getattr(settings, 'WS_CACHE_COMPRESSION_LEVEL', 6)
+
+    def encode(self, value):
+        if isinstance(value, Document):
+            return FORMAT_COREJSON, CoreJSONCodec().encode(value)
+        if is_plain_data(value):
+            return FORMAT_JSON, json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode(
+                'utf-8', 'surrogatepass')
+        return FORMAT_PICKLE, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def decode(value_format, data):
+        if value_format == FORMAT_JSON:
+            return json.loads(data.decode('utf-8', 'surrogatepass'))
+        if value_format == FORMAT_COREJSON:
+            return CoreJSONCodec().decode(data)
+        return pickle.loads(data)
+
+    def compress(self, data):
+        if len(data) < self.compress_min_size or not self.compression:
+            return COMPRESSION_NONE, data
+        if self.compression == 'lz4' and lz4_frame is not None:
+            return COMPRESSION_LZ4, lz4_frame.compress(data)
+        return COMPRESSION_ZLIB, zlib.compress(data, self.compression_level)
+
+    @staticmethod
+    def decompress(compression, data):
+        if compression == COMPRESSION_ZLIB:
+            return zlib.decompress(data)
+        if compression == COMPRESSION_LZ4:
+            return lz4_frame.decompress(data)
+        return data
+
+    def dumps(self, value):
+        value_format, data = self.encode(value)
+        compression, data = self.compress(data)
+        return HEADER.pack(HEADER_MAGIC, HEADER_VERSION, value_format, compression) + data
+
+    def loads(self, data):
+        if not isinstance(data, bytes) or data[:len(HEADER_MAGIC)] != HEADER_MAGIC:
+            return data
+        magic, version, value_format, compression = HEADER.unpack_from(data)
+        return self.decode(value_format, self.decompress(compression, data[HEADER.size:]))
+
+
+def get_serializer():
+    """
+    Returns the instance of the WS_CACHE_SERIALIZER class, which serializes the cached values with `dumps` and
+    deserializes them with `loads`, returning the values it did not serialize as they are
+    """
+    path = getattr(settings, 'WS_CACHE_SERIALIZER', 'bima_back.cache_serializers.CompactSerializer')
+    serializer = _serializers.get(path)
+    if serializer is None:
+        serializer = _serializers[path] = import_string(path)()
+    return serializer
+
+
+def get_key_namespace(key):
+    return key.split('_', 1)[0]
+
+
+def record_bytes(key, operation, data):
+    size = len(data) if isinstance(data, bytes) else 0
+    with _stats_lock:
+        stats = _stats.setdefault(get_key_namespace(key), {'writes': 0, 'write_bytes': 0, 'reads': 0, 'read_bytes': 0})
+        stats[operation + 's'] += 1
+        stats[operation + '_bytes'] += size
+
+
+def dumps(key, value):
+    data = get_serializer().dumps(value)
+    record_bytes(key, 'write', data)
+    return data
+
+
+def loads(key, data):
+    record_bytes(key, 'read', data)
+    return get_serializer().loads(data)
+
+
+def get_cache_stats():
+    """
+    Returns the number and bytes of the values written to and read from cache, by namespace, of the current process
+    """
+    with _stats_lock:
+        stats = {namespace: dict(namespace_stats) for namespace, namespace_stats in _stats.items()}
+    for namespace_stats in stats.values():
+        namespace_stats['mean_size'] = namespace_stats['write_bytes'] // (namespace_stats['writes'] or 1)
+    return stats
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from importlib import import_module
+
+from django.conf import settings
+from django.core.checks import register, Tags, Warning
+
+from .codegen import fetch_live_schema
+from .schemas import get_schema_signature
+
+
+@register(Tags.compatibility, deploy=True)
+def check_api_client_module(app_configs, **kwargs):
+    """
+    Warns when the live api schema no longer matches the generated client module (WS_API_CLIENT_MODULE).
+    The live schema is requested with the WS_SCHEMA_CHECK_TOKEN token, the check is skipped without it.
+    """
+    module_path = getattr(settings, 'WS_API_CLIENT_MODULE', None)
+    token = getattr(settings, 'WS_SCHEMA_CHECK_TOKEN', None)
+    if not module_path or not token:
+        return []
+
+    try:
+        signature = get_schema_signature(fetch_live_schema(token))
+    except Exception as e:
+        return [Warning("Api schema could not be requested to check {}: {}".format(module_path, e),
+                        id='bima_back.W002')]
+    if signature != import_module(module_path).SCHEMA_SIGNATURE:
+        return [Warning(
+            "The live api schema does not match the generated client module {}".format(module_path),
+            hint="Run the generate_api_client management command again",
+            id='bima_back.W001',
+        )]
+    return []
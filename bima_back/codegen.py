@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from os.path import join
+
+from coreapi.codecs import CoreJSONCodec
+from django.conf import settings
+
+from .constants import PRIVATE_API_SCHEMA_URL
+from .schemas import compile_links, get_schema_signature
+from .transports import get_client
+
+
+MODULE_HEADER = '''# -*- coding: utf-8 -*-
+# Generated by the `generate_api_client` management command from the bima-core api schema. Do not edit.
+# Set its import path in the WS_API_CLIENT_MODULE setting to use it instead of fetching the schema.
+from coreapi import Document, Field, Link
+
+
+SCHEMA_URL = {url!r}
+SCHEMA_TITLE = {title!r}
+SCHEMA_SIGNATURE = {signature!r}
+
+LINKS = {{
+{links}}}
+
+
+def get_schema():
+    """
+    Returns the api schema as a coreapi document
+    """
+    content = {{}}
+    for keys, link in LINKS.items():
+        node = content
+        for key in keys[:-1]:
+            node = node.setdefault(key, {{}})
+        node[keys[-1]] = link
+    return Document(url=SCHEMA_URL, title=SCHEMA_TITLE, content=content)
+'''
+
+
+def fetch_live_schema(token=None):
+    """
+    Requests the private api schema, with the permissions of the token user
+    """
+    headers = {'Authorization': 'Token {}'.format(token)} if token else {}
+    return get_client(headers=headers).get(join(settings.WS_BASE_URL, PRIVATE_API_SCHEMA_URL))
+
+
+def load_schema_file(path):
+    with open(path, 'rb') as schema_file:
+        return CoreJSONCodec().decode(schema_file.read())
+
+
+def render_field(field):
+    return 'Field(name={!r}, required={!r}, location={!r}, type={!r}, description={!r})'.format(
+        field.name, field.required, field.location, field.type, field.description)
+
+
+def render_link(compiled_link):
+    link = compiled_link.link
+    fields = ''.join('        {},\n'.format(render_field(field)) for field in link.fields)
+    return 'Link(url={!r}, action={!r}, encoding={!r}, transform={!r}, fields=[\n{}    ])'.format(
+        link.url, link.action, link.encoding, link.transform, fields)
+
+
+def render_client_module(schema):
+    """
+    Returns the source of a python module with the links of the schema, precompiled. The service clients dispatch
+    the actions through the compiled index of its schema (see schemas.get_generated_schema_index).
+    """
+    links = sorted(compile_links(schema))
+    return MODULE_HEADER.format(
+        url=schema.url,
+        title=schema.title,
+        signature=get_schema_signature(schema),
+        links=''.join('    {!r}: {},\n'.format(keys, render_link(compiled_link)) for keys, compiled_link in links),
+    )
@@ -20,6 +20,7 @@ DEFAULT_CONSTANCE = {
 
 # http code status
 HTTP_BAD_REQUEST = 400
+HTTP_NOT_FOUND = 404
 
 # config autocomplete forms
 AUTOCOMPLETE_DEFAULT_MIN_LENGTH = 0
@@ -101,3 +102,54 @@ PUBLIC_API_SCHEMA_URL = 'public_api/docs/'
 CACHE_USER_PROFILE_PREFIX_KEY = 'user'
 CACHE_SCHEMA_PREFIX_KEY = 'schema'
 CACHE_TAXONOMY_PREFIX_KEY = 'taxonomy'
+CACHE_OBJECT_PREFIX_KEY = 'object'
+
+# Service client bulkheads: each one has its own connection pool size, concurrent requests limit and timeout.
+# Overridable with WS_BULKHEADS and WS_BULKHEAD_ACTIONS settings.
+BULKHEAD_READS = 'reads'
+BULKHEAD_SEARCH = 'search'
+BULKHEAD_WRITES = 'writes'
+BULKHEAD_EXPORTS = 'exports'
+DEFAULT_BULKHEADS = {
+    BULKHEAD_READS: {'pool_maxsize': 10, 'max_concurrent': 32, 'max_wait': 0},
+    BULKHEAD_SEARCH: {'pool_maxsize': 4, 'max_concurrent': 8, 'max_wait': 0},
+    BULKHEAD_WRITES: {'pool_maxsize': 4, 'max_concurrent': 16, 'max_wait': 1},
+    BULKHEAD_EXPORTS: {'pool_maxsize': 2, 'max_concurrent': 2, 'max_wait': 0, 'timeout': (5, 300)},
+}
+# actions (path list joined by dots) out of their default bulkhead, which is reads for list and read actions and
+# writes for the rest
+BULKHEAD_ACTIONS = {
+    'search.list': BULKHEAD_SEARCH,
+    'exports.logger.list': BULKHEAD_EXPORTS,
+    'photos.import.album.create': BULKHEAD_EXPORTS,
+}
+
+# In-process cache tier in front of the shared cache, by namespace: max number of entries and seconds they are kept.
+# Overridable with WS_LOCAL_CACHE setting, a namespace with no entries skips the tier.
+DEFAULT_LOCAL_CACHE = {
+    CACHE_USER_PROFILE_PREFIX_KEY: {'max_size': 1000, 'ttl': 60},
+    CACHE_SCHEMA_PREFIX_KEY: {'max_size': 1000, 'ttl': 60},
+    CACHE_TAXONOMY_PREFIX_KEY: {'max_size': 200, 'ttl': 60},
+}
+
+# Cache warming, overridable with WS_CACHE_WARMING setting:
+#   tokens: api tokens of the service users to warm the cache with, one for each role (groups and permissions)
+#   languages: language codes to warm, all the LANGUAGES if None
+#   requests: service client actions and their parameters
+#   public_album_pages: first pages of the public album to warm
+#   max_rate: max requests per second to the api
+#   interval: seconds between the runs scheduled with rq-scheduler
+DEFAULT_CACHE_WARMING = {
+    'tokens': [],
+    'languages': None,
+    'requests': [
+        ('get_categories_list', {}),
+        ('get_categories_simple_list', {}),
+        ('get_categories_level_list', {'page': 1, 'root': 'True'}),
+        ('get_photo_type_list', {}),
+        ('get_groups_list', {}),
+    ],
+    'public_album_pages': 3,
+    'max_rate': 2,
+    'interval': 10 * 60,
+}
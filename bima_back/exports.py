@@ -1,17 +1,32 @@
 # -*- coding: utf-8 -*-
 import csv
 from datetime import datetime
-import io
+import logging
 
 from django.utils.text import slugify
 from django.utils.translation import ugettext as _
+from requests import RequestException
 
-from .utils import get
+from .service import ServiceClientException
+from .utils import get, get_class_name
+
+
+logger = logging.getLogger(__name__)
+
+
+class EchoBuffer(object):
+    """
+    File-like object which returns what is written to it, to stream the lines of a csv writer
+    """
+
+    def write(self, value):
+        return value
 
 
 class LogReport(object):
     """
-    Generates a csv file with logs of downloaded and visited images
+    Generates a csv file with logs of downloaded and visited images.
+    The logs are consumed lazily, so they can be streamed from an iterator.
     """
     _format = 'csv'
     _content_type = 'text/csv'
@@ -24,13 +39,9 @@ class LogReport(object):
             {'field': 'user.full_name', 'label': _('User')},
             {'field': 'added_at', 'label': _('Added at')},
         ]
-        self.file = io.StringIO()
-        self.writer = csv.writer(self.file)
         self.data = data or []
         self.username = get(user, 'username', 'anonymous_user')
 
-        self._generate_report()
-
     @property
     def content_type(self):
         return self._content_type
@@ -49,9 +60,21 @@ class LogReport(object):
 
     @property
     def csv(self):
-        return self.file.getvalue()
+        return ''.join(self.stream())
 
-    def _generate_report(self):
-        self.writer.writerow(self.titles)
-        for item in self.data:
-            self.writer.writerow([get(item, field, '') for field in self.fields])
+    def stream(self):
+        """
+        Yields the csv lines one by one. The response is already sent when a page of the logs fails, so the file
+        ends with an error row instead of being silently truncated.
+        """
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow(self.titles)
+        try:
+            for item in self.data:
+                yield writer.writerow([get(item, field, '') for field in self.fields])
+        except ServiceClientException as e:
+            logger.error("Logs export of %s interrupted: %s", self.username, e.code_text)
+            yield writer.writerow([_('Error: the export is incomplete'), e.code_text])
+        except RequestException as e:
+            logger.error("Logs export of %s interrupted: %r", self.username, e)
+            yield writer.writerow([_('Error: the export is incomplete'), get_class_name(e)])
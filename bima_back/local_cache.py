@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from .constants import DEFAULT_LOCAL_CACHE
+from .utils import bump_version, cache_delete, cache_get, cache_get_many, cache_set, is_available_cache
+
+
+# Two-tier cache: a bounded LRU per namespace in process memory, in front of the shared (django) cache.
+# Hot entries skip the network round trip and the unpickling of the shared cache. A value which replaces a different
+# one, or is deleted, bumps the version of its key in the shared cache, and every local entry records the version of
+# its key when it was read. Local entries are checked against that version every WS_GENERATION_CHECK_INTERVAL
+# seconds, so the writes made by other processes are seen after that interval at most, and only drop their own keys.
+# A version is kept as long as the local entries of the namespace: a lost version only makes them read again.
+# The values are shared by the threads of the process and must not be modified.
+
+_local_caches = {}
+_local_caches_pid = None
+_local_caches_lock = threading.Lock()
+
+_MISSING = object()
+
+
+class LocalCache(object):
+    """
+    LRU of up to `max_size` entries, which expire `ttl` seconds after they are stored. Each entry keeps the version of
+    its key and the time that version was checked.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Returns the (version, time checked, value) entry of a key, or default if it is missing or expired
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            expires, version, checked_at, value = entry
+            if expires < time.time():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return version, checked_at, value
+
+    def set(self, key, value, version=None):
+        with self.lock:
+            now = time.time()
+            self.entries[key] = (now + self.ttl, version, now, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def check(self, key):
+        """
+        Marks the version of an entry as checked now, keeping its expiration
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries[key] = (entry[0], entry[1], time.time(), entry[3])
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def get_local_cache_options(namespace):
+    """
+    Returns the options of the local tier of a namespace: its defaults updated with the WS_LOCAL_CACHE setting
+    """
+    options = dict(DEFAULT_LOCAL_CACHE.get(namespace, {}))
+    options.update(getattr(settings, 'WS_LOCAL_CACHE', {}).get(namespace, {}))
+    return options
+
+
+def get_local_cache(namespace):
+    """
+    Returns the local tier of a namespace for the current process, or None if the namespace has no local tier
+    """
+    global _local_caches, _local_caches_pid
+    pid = os.getpid()
+    if _local_caches_pid != pid or namespace not in _local_caches:
+        with _local_caches_lock:
+            if _local_caches_pid != pid:
+                _local_caches, _local_caches_pid = {}, pid
+            if namespace not in _local_caches:
+                options = get_local_cache_options(namespace)
+                _local_caches[namespace] = LocalCache(options['max_size'], options.get('ttl', 60)) \
+                    if options.get('max_size') else None
+    return _local_caches[namespace]
+
+
+def get_version_key(key):
+    return "version_{}".format(key)
+
+
+def is_checked(checked_at):
+    """
+    Whether the version of a local entry, checked at the given time, does not need to be checked again yet
+    """
+    return time.time() - checked_at < getattr(settings, 'WS_GENERATION_CHECK_INTERVAL', 1)
+
+
+def is_cached_locally(namespace, key):
+    """
+    Whether a key can be read from the local tier without any request to the shared cache
+    """
+    local_cache = get_local_cache(namespace) if is_available_cache() else None
+    entry = local_cache.get(key) if local_cache is not None else None
+    return entry is not None and is_checked(entry[1])
+
+
+def tiered_get(namespace, key, default=None, touch=False):
+    """
+    Returns a cached value from the local tier of its namespace, or from the shared cache storing it locally
+    :param touch: stores again the value read from the shared cache, to extend its timeout
+    """
+    local_cache = get_local_cache(namespace) if is_available_cache() else None
+    if local_cache is None:
+        value = cache_get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        if touch:
+            cache_set(key, value)
+        return value
+
+    entry = local_cache.get(key)
+    if entry is not None:
+        version, checked_at, value = entry
+        if is_checked(checked_at) or cache_get(get_version_key(key)) == version:
+            local_cache.check(key)
+            return value
+
+    version_key = get_version_key(key)
+    values = cache_get_many([key, version_key])
+    if key not in values:
+        local_cache.delete(key)
+        return default
+    if touch:
+        cache_set(key, values[key])
+    local_cache.set(key, values[key], values.get(version_key))
+    return values[key]
+
+
+def tiered_set(namespace, key, value, timeout=DEFAULT_TIMEOUT, invalidate=False):
+    """
+    Stores a value in the shared cache and in the local tier of its namespace
+    :param invalidate: bumps the version of the key, so other processes drop the copies of the key they keep locally.
+    Needed when the value replaces a different one.
+    """
+    cache_set(key, value, timeout)
+    local_cache = get_local_cache(namespace) if is_available_cache() else None
+    if local_cache is None:
+        return
+    version = bump_version(get_version_key(key), local_cache.ttl) if invalidate else None
+    local_cache.set(key, value, version)
+
+
+def tiered_delete(namespace, key):
+    """
+    Removes a value from the shared cache and from the local tier of every process
+    """
+    cache_delete(key)
+    local_cache = get_local_cache(namespace) if is_available_cache() else None
+    if local_cache is not None:
+        local_cache.delete(key)
+        bump_version(get_version_key(key), local_cache.ttl)
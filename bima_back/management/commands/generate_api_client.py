@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from django.core.management import BaseCommand, CommandError
+
+from ...codegen import fetch_live_schema, load_schema_file, render_client_module
+
+
+class Command(BaseCommand):
+    help = "Generates a static python client module from the bima-core api schema (a CoreJSON file or the live api)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Path of the python module to write")
+        parser.add_argument('--schema-file', help="CoreJSON schema file to read instead of requesting the live api")
+        parser.add_argument('--token', help="Api token of the user whose schema is requested to the live api")
+        parser.add_argument('--check', action='store_true',
+                            help="Does not write the module, fails if it is not up to date with the schema")
+
+    def handle(self, *args, **options):
+        if options['schema_file']:
+            schema = load_schema_file(options['schema_file'])
+        else:
+            schema = fetch_live_schema(options['token'])
+        source = render_client_module(schema)
+
+        if options['check']:
+            try:
+                with open(options['output']) as module_file:
+                    up_to_date = module_file.read() == source
+            except IOError:
+                up_to_date = False
+            if not up_to_date:
+                raise CommandError("{} does not match the api schema".format(options['output']))
+            self.stdout.write("{} is up to date".format(options['output']))
+            return
+
+        with open(options['output'], 'w') as module_file:
+            module_file.write(source)
+        self.stdout.write(self.style.SUCCESS("Generated {}".format(options['output'])))
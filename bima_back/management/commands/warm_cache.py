@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from django.core.management import BaseCommand, CommandError
+
+from ...warming import schedule_cache_warming, warm_cache
+
+
+class Command(BaseCommand):
+    help = "Warms the cached reference data and public album pages for the WS_CACHE_WARMING identities and languages"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enqueue', action='store_true',
+                            help="Enqueues a run in the rq 'back' queue instead of running it")
+        parser.add_argument('--schedule', action='store_true',
+                            help="Schedules the periodic runs in the rq 'back' queue, requires rq-scheduler")
+        parser.add_argument('--interval', type=int, help="Seconds between the scheduled runs")
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            try:
+                schedule_cache_warming(options['interval'])
+            except ImportError as e:
+                raise CommandError("rq-scheduler is required to schedule the cache warming: {}".format(e))
+            self.stdout.write(self.style.SUCCESS("Cache warming scheduled"))
+            return
+
+        if options['enqueue']:
+            from ...tasks import warm_cache_job
+            warm_cache_job.delay()
+            self.stdout.write(self.style.SUCCESS("Cache warming enqueued"))
+            return
+
+        report = warm_cache()
+        self.stdout.write(str(report))
+        if report.errors:
+            raise CommandError("{} entries could not be warmed".format(len(report.errors)))
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from django.contrib.auth import SESSION_KEY
+from django.utils.deprecation import MiddlewareMixin
+
+from .constants import CACHE_SCHEMA_PREFIX_KEY, CACHE_USER_PROFILE_PREFIX_KEY
+from .local_cache import get_version_key, is_cached_locally
+from .schemas import get_user_schema_key
+from .utils import cache_prefetch, clear_cache_prefetch, get_known_generation
+
+
+class CachePrefetchMiddleware(MiddlewareMixin):
+    """
+    Reads from cache, with a single round trip, what the request is going to need: the profile and schema pointer of
+    the logged user with their versions, and the generations of the `cache_namespaces` of the view. The values already
+    kept in process are skipped.
+    Must be placed after the SessionMiddleware.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_namespaces = getattr(getattr(view_func, 'view_class', None), 'cache_namespaces', ())
+        namespaces = [namespace for namespace in view_namespaces if get_known_generation(namespace) is None]
+
+        keys = []
+        user_id = request.session.get(SESSION_KEY) if hasattr(request, 'session') else None
+        if user_id:
+            user_keys = (
+                (CACHE_USER_PROFILE_PREFIX_KEY, "{}_{}".format(CACHE_USER_PROFILE_PREFIX_KEY, user_id)),
+                (CACHE_SCHEMA_PREFIX_KEY, get_user_schema_key(user_id)),
+            )
+            keys = [cache_key for namespace, key in user_keys if not is_cached_locally(namespace, key)
+                    for cache_key in (key, get_version_key(key))]
+        cache_prefetch(keys, namespaces)
+
+    def process_response(self, request, response):
+        clear_cache_prefetch()
+        return response
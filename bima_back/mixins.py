@@ -257,6 +257,8 @@ class ServiceClientMixin(MessageMixin, ContextMixin):
     client_class = DAMWebService
     restore_action_name = ''
     action_name = ''
+    # namespaces of the cached responses the view reads, whose generations are prefetched (CachePrefetchMiddleware)
+    cache_namespaces = ()
 
     def dispatch(self, request, *args, **kwargs):
         try:
@@ -279,9 +281,15 @@ class ServiceClientMixin(MessageMixin, ContextMixin):
 
     def get_client(self):
         """
+        The client is built once per request and shared by every call done while serving it.
         :return: Client instance
         """
-        return self.client_class(self.request)
+        clients = getattr(self.request, '_service_clients', None)
+        if clients is None:
+            clients = self.request._service_clients = {}
+        if self.client_class not in clients:
+            clients[self.client_class] = self.client_class(self.request)
+        return clients[self.client_class]
 
     def get_action_name(self):
         """
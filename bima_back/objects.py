@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .constants import CACHE_OBJECT_PREFIX_KEY
+from .utils import cache_get, cache_get_many, cache_set_many, is_available_cache
+
+
+# Read-through cache of the single objects read from the api (photos, albums, galleries and categories).
+# The response depends on the language and on the permissions of the user, so every object is stored in one entry
+# with all its variants, and a write evicts all of them at once:
+#   object_<resource>_<id> -> {(language, permission scope): (expiration time, response or MissingObject)}
+# The responses of photos, albums and galleries hold the permissions of the user on the object (owner, group...), so
+# their variants are kept by user too: (language, permission scope, user id).
+# The objects read in bulk from the list actions are stored in their own variant, ending with 'list', since the list
+# responses may hold less data than the read ones.
+
+OBJECT_RESOURCES = ('albums', 'categories', 'galleries', 'photos')
+USER_SCOPED_RESOURCES = ('albums', 'galleries', 'photos')
+
+# cached 404 response of an object, with the title of the error
+MissingObject = namedtuple('MissingObject', ['title'])
+
+
+def get_object_cache_key(resource, object_id):
+    return "{}_{}_{}".format(CACHE_OBJECT_PREFIX_KEY, resource, object_id)
+
+
+def get_object_ttl(value):
+    """
+    Seconds an object is cached: WS_OBJECT_CACHE_TTL, or WS_OBJECT_CACHE_MISS_TTL for the missing ones
+    """
+    if isinstance(value, MissingObject):
+        return getattr(settings, 'WS_OBJECT_CACHE_MISS_TTL', 30)
+    return getattr(settings, 'WS_OBJECT_CACHE_TTL', 5 * 60)
+
+
+def get_object_variant(resource, language, permission_scope, user_id):
+    """
+    Returns the variant of the objects of a resource read by a user
+    """
+    if resource in USER_SCOPED_RESOURCES:
+        return language, permission_scope, user_id
+    return language, permission_scope
+
+
+def get_cached_object(resource, object_id, variant):
+    """
+    Returns the cached response (or MissingObject) of an object in the given variant, or None if it is not cached
+    """
+    expires, value = cache_get(get_object_cache_key(resource, object_id), {}).get(variant, (0, None))
+    return value if expires > time.time() else None
+
+
+def get_cached_objects(resource, object_ids, variants):
+    """
+    Returns the cached responses of the given objects by id, each one in the first of the variants which is cached.
+    Missing objects are left out.
+    """
+    keys = {get_object_cache_key(resource, object_id): object_id for object_id in object_ids}
+    cached, now = {}, time.time()
+    for key, entry in cache_get_many(list(keys)).items():
+        for variant in variants:
+            expires, value = entry.get(variant, (0, None))
+            if expires > now and value is not None and not isinstance(value, MissingObject):
+                cached[keys[key]] = value
+                break
+    return cached
+
+
+def set_cached_object(resource, object_id, variant, value):
+    set_cached_objects(resource, {object_id: value}, variant)
+
+
+def set_cached_objects(resource, values, variant):
+    """
+    Caches the responses (or MissingObject) of several objects, given by id, in the given variant
+    """
+    if not values or not is_available_cache():
+        return
+    values = {get_object_cache_key(resource, object_id): value for object_id, value in values.items()}
+    entries, now = cache_get_many(list(values)), time.time()
+    for key, value in values.items():
+        variants = {cached_variant: cached for cached_variant, cached in entries.get(key, {}).items()
+                    if cached[0] > now}
+        variants[variant] = (now + get_object_ttl(value), value)
+        entries[key] = variants
+    timeout = max(expires for variants in entries.values() for expires, value in variants.values()) - now
+    cache_set_many({key: entries[key] for key in values}, timeout)
+
+
+def evict_objects(resource, *object_ids):
+    """
+    Removes every variant of the given objects from cache
+    """
+    keys = [get_object_cache_key(resource, object_id) for object_id in object_ids if object_id]
+    if keys:
+        cache.delete_many(keys)
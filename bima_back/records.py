@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+from abc import ABCMeta
+from collections.abc import MutableMapping
+import sys
+
+
+class Missing(object):
+    """
+    Value of the record fields absent from the api response
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'MISSING'
+
+
+MISSING = Missing()
+
+
+def intern_keys(value):
+    if isinstance(value, dict):
+        return {sys.intern(key): intern_keys(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [intern_keys(item) for item in value]
+    return value
+
+
+class RecordType(ABCMeta):
+    """
+    Indexes the fields of every record class
+    """
+
+    def __init__(cls, name, bases, attrs):
+        super().__init__(name, bases, attrs)
+        cls._indexes = {field: index for index, field in enumerate(cls.fields)}
+
+
+class Record(MutableMapping, metaclass=RecordType):
+    """
+    Compact form of an object returned by the api. The values of the known `fields` are stored in a list, without
+    their keys. The nested values (dicts and lists) are kept as decoded by the client: encoding them again costs more
+    CPU per page than it saves, as most pages are rendered once, and the cached ones are pickled anyway.
+    It is a mapping, so `record['extra_info']['album']`, `record.get('title')` and template lookups work as with
+    the decoded json, and the fields are also available as attributes, as `utils.get` requires.
+    Unknown fields are kept in an extra dict.
+    """
+    __slots__ = ('_values', '_extra')
+    fields = ()
+
+    def __init__(self, data=None):
+        data = dict(data or {})
+        self._values = [data.pop(field, MISSING) for field in self.fields]
+        self._extra = data or None
+
+    def __getitem__(self, key):
+        index = self._indexes.get(key)
+        if index is None:
+            if self._extra is None:
+                raise KeyError(key)
+            return self._extra[key]
+        value = self._values[index]
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        index = self._indexes.get(key)
+        if index is not None:
+            self._values[index] = value
+        else:
+            self._extra = self._extra or {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        index = self._indexes.get(key)
+        if index is not None and self._values[index] is not MISSING:
+            self._values[index] = MISSING
+        elif index is None and self._extra and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for field, value in zip(self.fields, self._values):
+            if value is not MISSING:
+                yield field
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return len([value for value in self._values if value is not MISSING]) + len(self._extra or ())
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getstate__(self):
+        """
+        Pickles the present values only, with a bit mask of their fields, and the nested ones with their keys
+        interned, so the pickle memo stores every key once for all the records of a page
+        """
+        mask, values = 0, []
+        for index, value in enumerate(self._values):
+            if value is not MISSING:
+                mask |= 1 << index
+                values.append(intern_keys(value))
+        return mask, values, self._extra
+
+    def __setstate__(self, state):
+        mask, values, self._extra = state
+        values = iter(values)
+        self._values = [next(values) if mask & 1 << index else MISSING for index in range(len(self.fields))]
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, dict(self))
+
+
+class Photo(Record):
+    __slots__ = ()
+    fields = (
+        'id', 'title', 'description', 'status', 'upload_status', 'owner', 'album', 'author', 'copyright',
+        'internal_usage_restriction', 'external_usage_restriction', 'photo_type', 'identifier', 'original_file_name',
+        'width', 'height', 'size', 'image', 'image_file', 'image_thumbnail', 'image_small', 'image_small_fit',
+        'image_medium', 'image_large', 'image_original', 'image_flickr', 'latitude', 'longitude', 'position',
+        'address', 'postcode', 'district', 'neighborhood', 'province', 'municipality', 'camera_model', 'exif_date',
+        'categorize_date', 'created_at', 'modified_at', 'extra_info', 'keywords', 'names', 'categories',
+        'permissions',
+    )
+
+
+class Album(Record):
+    __slots__ = ()
+    fields = (
+        'id', 'title', 'description', 'slug', 'cover', 'image_thumbnail', 'owners', 'created_at', 'modified_at',
+        'extra_info', 'permissions',
+    )
+
+
+class Gallery(Record):
+    __slots__ = ()
+    fields = (
+        'id', 'title', 'description', 'slug', 'status', 'cover', 'image_thumbnail', 'owners', 'created_at',
+        'modified_at', 'extra_info', 'permissions',
+    )
+
+
+class Category(Record):
+    __slots__ = ()
+    fields = ('id', 'name', 'title', 'parent', 'root', 'extra_info', 'ancestors', 'children', 'permissions')
+
+
+class LogEntry(Record):
+    __slots__ = ()
+    fields = (
+        'id', 'photo', 'title', 'action', 'get_action_display', 'user', 'added_at', 'filename', 'status',
+        'status_display', 'created_at', 'completed_at',
+    )
+
+
+# record type of the read and list actions by resource (first element of the path list)
+RECORD_TYPES = {
+    'albums': Album,
+    'categories': Category,
+    'galleries': Gallery,
+    'logger': LogEntry,
+    'photos': Photo,
+    'search': Photo,
+}
+
+
+def to_records(path_list, response):
+    """
+    Returns the response of a read or list action with its objects as records, if the resource has a record type
+    """
+    record_type = RECORD_TYPES.get(path_list[0])
+    if record_type is None or len(path_list) != 2 or not isinstance(response, dict):
+        return response
+    if path_list[-1] == 'read':
+        return record_type(response)
+    if isinstance(response.get('results'), list):
+        response = dict(response)
+        response['results'] = [record_type(item) if isinstance(item, dict) else item for item in response['results']]
+    return response
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+from collections import deque
+import random
+import threading
+import time
+
+from django.conf import settings
+from requests import RequestException
+
+from .constants import BULKHEAD_ACTIONS, BULKHEAD_READS, BULKHEAD_WRITES
+from .transports import get_bulkhead_options
+
+
+# Retries
+
+def get_retry_attempts(action):
+    """
+    Returns the number of retries of an action (path list joined by dots, i.e. 'photos.read'),
+    set in WS_RETRY_ACTIONS or the WS_RETRY_ATTEMPTS default.
+    """
+    retry_actions = getattr(settings, 'WS_RETRY_ACTIONS', {})
+    return retry_actions.get(action, getattr(settings, 'WS_RETRY_ATTEMPTS', 2))
+
+
+def get_backoff_delay(attempt):
+    """
+    Exponential backoff with full jitter: a random delay up to base * 2 ^ attempt, capped at WS_RETRY_MAX_BACKOFF
+    """
+    base = getattr(settings, 'WS_RETRY_BACKOFF', 0.1)
+    cap = getattr(settings, 'WS_RETRY_MAX_BACKOFF', 2)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def is_transient_error(error, status_code=None):
+    """
+    Network errors and server errors (5xx) are worth retrying, client errors (4xx) are not
+    """
+    return isinstance(error, RequestException) or (status_code or 0) >= 500
+
+
+# Circuit breaker
+
+class CircuitBreaker(object):
+    """
+    Fails fast when the error rate of an endpoint in the last `window` seconds reaches `failure_rate`.
+    After `recovery_timeout` seconds open, up to `half_open_calls` probe calls are let through (half-open): a success
+    closes the circuit and a failure opens it again. A probe whose outcome is not recorded in `recovery_timeout`
+    seconds no longer counts, so a lost probe can not keep the circuit half-open.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name, failure_rate=0.5, min_calls=10, window=30, recovery_timeout=30, half_open_calls=1):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.recovery_timeout = recovery_timeout
+        self.half_open_calls = half_open_calls
+        self.outcomes = deque()
+        self.probes = deque()
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.time() - self.opened_at >= self.recovery_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """
+        Whether a call can be sent. In half-open state, the allowed calls are the probes.
+        """
+        state = self.state
+        if state != self.HALF_OPEN:
+            return state == self.CLOSED
+        now = time.time()
+        with self.lock:
+            while self.probes and self.probes[0] < now - self.recovery_timeout:
+                self.probes.popleft()
+            if len(self.probes) >= self.half_open_calls:
+                return False
+            self.probes.append(now)
+            return True
+
+    @property
+    def is_open(self):
+        return self.state == self.OPEN
+
+    def _record(self, success):
+        now = time.time()
+        self.outcomes.append((now, success))
+        while self.outcomes and self.outcomes[0][0] < now - self.window:
+            self.outcomes.popleft()
+
+    def record_success(self):
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.opened_at = None
+                self.outcomes.clear()
+                self.probes.clear()
+            self._record(True)
+
+    def record_failure(self):
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.opened_at = time.time()
+                self.probes.clear()
+                return
+            self._record(False)
+            failures = len([outcome for outcome in self.outcomes if not outcome[1]])
+            if len(self.outcomes) >= self.min_calls and failures >= self.failure_rate * len(self.outcomes):
+                self.opened_at = time.time()
+
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name):
+    """
+    Returns the process-wide circuit breaker of an endpoint, configured with the WS_CIRCUIT_BREAKER setting
+    """
+    circuit_breaker = _circuit_breakers.get(name)
+    if circuit_breaker is None:
+        with _circuit_breakers_lock:
+            circuit_breaker = _circuit_breakers.setdefault(
+                name, CircuitBreaker(name, **getattr(settings, 'WS_CIRCUIT_BREAKER', {})))
+    return circuit_breaker
+
+
+# Hedged requests
+
+class HedgePolicy(object):
+    """
+    Latency stats of a hedged action: the delay after which a second identical request is sent is fixed
+    or the rolling p95 of the action latency.
+    """
+
+    def __init__(self, action, delay=None, samples=100, min_samples=20):
+        self.action = action
+        self.delay = delay
+        self.latencies = deque(maxlen=samples)
+        self.min_samples = min_samples
+        self.requests = 0
+        self.hedged = 0
+        self.wins = 0
+
+    def get_delay(self):
+        """
+        Returns the seconds to wait before hedging, or None if there is not enough latency samples yet
+        """
+        if self.delay is not None:
+            return self.delay
+        latencies = sorted(self.latencies)
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[int(len(latencies) * 0.95) - 1]
+
+    def add_latency(self, latency):
+        self.latencies.append(latency)
+
+    @property
+    def win_rate(self):
+        return self.wins / self.hedged if self.hedged else 0
+
+    def get_stats(self):
+        return {
+            'requests': self.requests,
+            'hedged': self.hedged,
+            'wins': self.wins,
+            'win_rate': self.win_rate,
+            'delay': self.get_delay(),
+        }
+
+
+_hedge_policies = {}
+_hedge_lock = threading.Lock()
+
+
+def get_hedge_policy(action):
+    """
+    Returns the hedge policy of an action, or None if the action is not hedged.
+    Hedging is opt-in: WS_HEDGE_ACTIONS maps the hedged read actions to their fixed delay in seconds, or None to
+    hedge after the rolling p95 latency of the action.
+    """
+    hedge_actions = getattr(settings, 'WS_HEDGE_ACTIONS', {})
+    if action not in hedge_actions:
+        return None
+    policy = _hedge_policies.get(action)
+    if policy is None:
+        with _hedge_lock:
+            policy = _hedge_policies.setdefault(action, HedgePolicy(action, hedge_actions[action]))
+    return policy
+
+
+def start_hedged_request(policy):
+    """
+    Counts a request of a hedged action
+    """
+    with _hedge_lock:
+        policy.requests += 1
+
+
+def allow_hedge(policy):
+    """
+    Counts a hedge if the extra load of all the hedged actions stays under WS_HEDGE_MAX_RATIO of their requests
+    """
+    max_ratio = getattr(settings, 'WS_HEDGE_MAX_RATIO', 0.1)
+    with _hedge_lock:
+        requests = sum(hedge_policy.requests for hedge_policy in _hedge_policies.values())
+        hedged = sum(hedge_policy.hedged for hedge_policy in _hedge_policies.values())
+        if hedged + 1 > max_ratio * requests:
+            return False
+        policy.hedged += 1
+        return True
+
+
+def record_hedge_win(policy):
+    with _hedge_lock:
+        policy.wins += 1
+
+
+def get_hedge_stats():
+    """
+    Returns the hedge counts and win rates by action of the current process
+    """
+    return {action: policy.get_stats() for action, policy in _hedge_policies.items()}
+
+
+# Bulkheads
+
+class Bulkhead(object):
+    """
+    Limits the concurrent requests of a class of actions, so a burst of slow actions (i.e. exports) can not
+    starve the rest. Requests over the limit wait up to `max_wait` seconds and then fail fast.
+    """
+
+    def __init__(self, name, max_concurrent=10, max_wait=0, **options):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self.semaphore = threading.BoundedSemaphore(max_concurrent)
+
+    def acquire(self):
+        if self.max_wait:
+            return self.semaphore.acquire(timeout=self.max_wait)
+        return self.semaphore.acquire(blocking=False)
+
+    def release(self):
+        self.semaphore.release()
+
+
+_bulkheads = {}
+_bulkheads_lock = threading.Lock()
+
+
+def get_bulkhead_name(action, is_read):
+    bulkhead_actions = dict(BULKHEAD_ACTIONS, **getattr(settings, 'WS_BULKHEAD_ACTIONS', {}))
+    return bulkhead_actions.get(action, BULKHEAD_READS if is_read else BULKHEAD_WRITES)
+
+
+def get_bulkhead(name):
+    """
+    Returns the process-wide bulkhead with the given name
+    """
+    bulkhead = _bulkheads.get(name)
+    if bulkhead is None:
+        with _bulkheads_lock:
+            bulkhead = _bulkheads.setdefault(name, Bulkhead(name, **get_bulkhead_options(name)))
+    return bulkhead
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+from functools import partial
+from hashlib import sha1
+from importlib import import_module
+import json
+import threading
+import time
+
+from coreapi.client import LinkAncestor
+from coreapi.codecs import CoreJSONCodec
+from coreapi.document import Document, Link, Object
+from coreapi.exceptions import LinkLookupError, ParameterError
+from coreapi.utils import determine_transport
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from .constants import CACHE_SCHEMA_PREFIX_KEY
+from .local_cache import tiered_delete, tiered_get, tiered_set
+from .utils import cache_get, cache_get_or_compute, cache_set, SingleFlight
+
+
+# The api schema depends on the user permissions, so users sharing groups and permissions share the same schema.
+# Schemas are stored once per content hash, and small pointers reference them:
+#   schema_user_<user_id>      -> content hash
+#   schema_role_<fingerprint>  -> ComputedValue of the content hash
+#   schema_public              -> ComputedValue of the content hash of the public api schema
+#   schema_content_<hash>      -> coreapi Document
+
+def get_user_schema_key(user_id):
+    return "{}_user_{}".format(CACHE_SCHEMA_PREFIX_KEY, user_id)
+
+
+def get_role_schema_key(fingerprint):
+    return "{}_role_{}".format(CACHE_SCHEMA_PREFIX_KEY, fingerprint)
+
+
+def get_public_schema_key():
+    return "{}_public".format(CACHE_SCHEMA_PREFIX_KEY)
+
+
+def get_content_schema_key(content_hash):
+    return "{}_content_{}".format(CACHE_SCHEMA_PREFIX_KEY, content_hash)
+
+
+def get_permission_fingerprint(user_params):
+    """
+    Returns a hash of the user groups and permissions, the data which the api schema depends on
+    """
+    data = [
+        sorted(user_params.get('dam_groups') or []),
+        user_params.get('permissions') or {},
+        bool(user_params.get('is_superuser')),
+    ]
+    return sha1(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def get_schema_content_hash(schema):
+    return sha1(CoreJSONCodec().encode(schema)).hexdigest()
+
+
+def get_schema_signature(schema):
+    """
+    Returns a hash of what the requests to the api depend on: the path, url, method, encoding and fields
+    of every link, no matter the order or the descriptions of the schema
+    """
+    data = sorted(
+        [list(keys), link.url, link.method, link.encoding,
+         sorted([field.name, bool(field.required), field.location] for field in link.fields)]
+        for keys, link in compile_links(schema)
+    )
+    return sha1(json.dumps(data).encode('utf-8')).hexdigest()
+
+
+# Compiled link index
+
+CompiledLink = namedtuple('CompiledLink', ['link', 'url', 'method', 'encoding', 'fields', 'locations', 'required',
+                                           'optional', 'ancestors'])
+
+# process-wide compiled indexes by schema content hash
+SCHEMA_INDEX_MAX_SIZE = 64
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+# coalesces the schema fetches of the same role (or user) requested at the same time
+schema_flight = SingleFlight()
+
+# public schema index of the process and the time it was checked against the cache pointer
+_public_index = (0, None)
+
+
+def compile_links(node, keys=(), ancestors=()):
+    """
+    Walks the schema once yielding every link with its path and resolved data
+    """
+    if isinstance(node, Document):
+        ancestors += (LinkAncestor(document=node, keys=list(keys)), )
+    for key, value in node.items():
+        path = keys + (key, )
+        if isinstance(value, Link):
+            yield path, CompiledLink(
+                link=value,
+                url=value.url,
+                method=(value.action or 'get').upper(),
+                encoding=value.encoding or 'application/json',
+                fields=value.fields,
+                locations={field.name: field.location for field in value.fields},
+                required=frozenset(field.name for field in value.fields if field.required),
+                optional=frozenset(field.name for field in value.fields if not field.required),
+                ancestors=list(ancestors),
+            )
+        elif isinstance(value, (Document, Object)):
+            yield from compile_links(value, path, ancestors)
+
+
+class SchemaIndex(object):
+    """
+    Flat map from the action path to its compiled link, built once per schema version.
+    Dispatching an action through it costs the same no matter how large the schema is.
+    """
+
+    def __init__(self, schema, content_hash=None):
+        self.schema = schema
+        self.content_hash = content_hash or get_schema_content_hash(schema)
+        self.links = dict(compile_links(schema))
+
+    def __contains__(self, keys):
+        return tuple(keys) in self.links
+
+    def __getitem__(self, keys):
+        try:
+            return self.links[tuple(keys)]
+        except KeyError:
+            raise LinkLookupError("Index {} did not reference a link.".format(list(keys)))
+
+    @staticmethod
+    def validate(compiled_link, params):
+        """
+        Same validation as the coreapi client, with the required and optional field names precomputed
+        """
+        provided = set(params.keys())
+        errors = {name: 'This parameter is required.' for name in compiled_link.required - provided}
+        errors.update({
+            name: 'Unknown parameter.' for name in provided - compiled_link.required - compiled_link.optional
+        })
+        if errors:
+            raise ParameterError(errors)
+
+    def action(self, client, keys, params=None, validate=True):
+        """
+        Equivalent to `client.action(schema, keys, params)`
+        """
+        params = params or {}
+        compiled_link = self[keys]
+        if validate:
+            self.validate(compiled_link, params)
+        transport = determine_transport(client.transports, compiled_link.url)
+        return transport.transition(compiled_link.link, client.decoders, params=params,
+                                    link_ancestors=compiled_link.ancestors)
+
+    def direct_action(self, transport, keys, params=None, validate=True):
+        """
+        Equivalent to `action` through a DirectTransport, which skips the coreapi encoding and decoding
+        """
+        params = params or {}
+        compiled_link = self[keys]
+        if validate:
+            self.validate(compiled_link, params)
+        return transport.request(compiled_link, params)
+
+
+def get_schema_index(content_hash):
+    """
+    Returns the compiled index of a schema version, compiling it from the cached schema if needed
+    """
+    if not content_hash:
+        return None
+    index = _indexes.get(content_hash)
+    if index is None:
+        schema = cache_get(get_content_schema_key(content_hash))
+        if not schema:
+            return None
+        index = add_schema_index(SchemaIndex(schema, content_hash))
+    return index
+
+
+def add_schema_index(index):
+    with _indexes_lock:
+        if len(_indexes) >= SCHEMA_INDEX_MAX_SIZE:
+            _indexes.clear()
+        return _indexes.setdefault(index.content_hash, index)
+
+
+def get_generated_schema_index():
+    """
+    Returns the compiled index of the client module generated at build time (WS_API_CLIENT_MODULE), if any.
+    With it no schema is requested to the api, neither at login nor when a service is initialized.
+    """
+    module_path = getattr(settings, 'WS_API_CLIENT_MODULE', None)
+    if not module_path:
+        return None
+    module = import_module(module_path)
+    index = _indexes.get(module.SCHEMA_SIGNATURE)
+    if index is None:
+        index = add_schema_index(SchemaIndex(module.get_schema(), module.SCHEMA_SIGNATURE))
+    return index
+
+
+def load_schema_index(user_id, fetch_schema, user_params=None):
+    """
+    Returns the compiled api schema of the generated client module if set, otherwise the one of the user from cache,
+    or the one fetched from the api if it is not cached yet.
+    :param user_id: id of the user who requests the schema
+    :param fetch_schema: callable which requests the schema to the api
+    :param user_params: cached user profile, used to share the schema between users with same permissions
+    :return: SchemaIndex
+    """
+    index = get_generated_schema_index()
+    if index is not None:
+        return index
+
+    user_key = get_user_schema_key(user_id)
+    user_content_hash = tiered_get(CACHE_SCHEMA_PREFIX_KEY, user_key)
+    index = get_schema_index(user_content_hash)
+
+    if index is None and user_params:
+        role_key = get_role_schema_key(get_permission_fingerprint(user_params))
+        index = get_schema_index(schema_flight.do(role_key, get_or_fetch_schema, role_key, fetch_schema))
+
+    if index is None:
+        index = schema_flight.do(user_key, fetch_schema_index, fetch_schema)
+
+    if user_content_hash != index.content_hash:
+        tiered_set(CACHE_SCHEMA_PREFIX_KEY, user_key, index.content_hash)
+    return index
+
+
+def fetch_schema_index(fetch_schema):
+    """
+    Fetches the schema from the api, compiles it and stores it in cache
+    """
+    schema = fetch_schema()
+    index = add_schema_index(SchemaIndex(schema))
+    cache_set(get_content_schema_key(index.content_hash), schema)
+    return index
+
+
+def get_or_fetch_schema(pointer_key, fetch_schema):
+    """
+    Returns the content hash of the schema version referenced by a pointer (of a role or the public one), fetching
+    the schema through the stampede-safe cache when it is missing, so only one node fetches it at a time.
+    Pointers are kept WS_SCHEMA_POINTER_TTL seconds.
+    """
+    return cache_get_or_compute(
+        pointer_key,
+        lambda: fetch_schema_index(fetch_schema).content_hash,
+        getattr(settings, 'WS_SCHEMA_POINTER_TTL', DEFAULT_TIMEOUT),
+        is_valid=lambda content_hash: get_schema_index(content_hash) is not None,
+        getter=partial(tiered_get, CACHE_SCHEMA_PREFIX_KEY),
+        setter=partial(tiered_set, CACHE_SCHEMA_PREFIX_KEY),
+    )
+
+
+def load_public_schema_index(fetch_schema):
+    """
+    Returns the compiled public api schema. It is kept in the process for WS_PUBLIC_SCHEMA_PROCESS_TTL seconds, and
+    then checked against the version (content hash) cached, so all the processes share a single fetch.
+    :param fetch_schema: callable which requests the public schema to the api
+    :return: SchemaIndex
+    """
+    global _public_index
+    checked_at, index = _public_index
+    if index is not None and time.time() - checked_at < getattr(settings, 'WS_PUBLIC_SCHEMA_PROCESS_TTL', 60):
+        return index
+
+    public_key = get_public_schema_key()
+    index = get_schema_index(schema_flight.do(public_key, get_or_fetch_schema, public_key, fetch_schema))
+    _public_index = (time.time(), index)
+    return index
+
+
+def clear_user_schema(user_id):
+    """
+    Forgets the schema of the user, i.e. after a login, when the user permissions may have changed
+    """
+    tiered_delete(CACHE_SCHEMA_PREFIX_KEY, get_user_schema_key(user_id))
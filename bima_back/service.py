@@ -1,18 +1,36 @@
 # -*- coding: utf-8 -*-
 
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from concurrent.futures import FIRST_COMPLETED, wait
 from enum import IntEnum, unique
+from functools import partial
+from hashlib import sha1
+import json
+import logging
 from os.path import join
+import threading
+import time
 import six
 
-from coreapi import Client
 from coreapi.exceptions import CoreAPIException, ErrorMessage, ParameterError
-from coreapi.transports import HTTPTransport
 from django.conf import settings
 from django.core.cache import cache
-
-from .utils import get_class_name, cache_set, cache_delete_startswith
-from .constants import HTTP_BAD_REQUEST, ACTION_VIEW_PHOTO, ACTION_DOWNLOAD_PHOTO, CACHE_USER_PROFILE_PREFIX_KEY, \
-    CACHE_SCHEMA_PREFIX_KEY, PRIVATE_API_SCHEMA_URL, PUBLIC_API_SCHEMA_URL
+from requests import RequestException, Timeout
+
+from .local_cache import tiered_get, tiered_set
+from .records import to_records
+from .resilience import get_backoff_delay, get_circuit_breaker, get_retry_attempts, is_transient_error, \
+    get_hedge_policy, start_hedged_request, allow_hedge, record_hedge_win, get_bulkhead, get_bulkhead_name
+from .objects import evict_objects, get_cached_object, get_cached_objects, get_object_variant, set_cached_object, \
+    set_cached_objects, MissingObject, USER_SCOPED_RESOURCES
+from .schemas import get_permission_fingerprint, load_public_schema_index, load_schema_index
+from .transports import get_bulkhead_timeout, get_client, get_deferred_executor, get_executor, DirectTransport
+from .utils import get_class_name, cache_compute, cache_get, cache_get_or_compute, cache_set, get_accept_language, \
+    get_lease_key, get_namespaced_key, invalidate_namespace, normalize_params, SingleFlight
+from .constants import HTTP_BAD_REQUEST, HTTP_NOT_FOUND, ACTION_VIEW_PHOTO, ACTION_DOWNLOAD_PHOTO, \
+    PHOTO_PUBLIC_STATUS, CACHE_TAXONOMY_PREFIX_KEY, CACHE_USER_PROFILE_PREFIX_KEY, PRIVATE_API_SCHEMA_URL, \
+    PUBLIC_API_SCHEMA_URL
 
 
 @unique
@@ -25,6 +43,30 @@ class UploadStatus(IntEnum):
     uploaded = 2
 
 
+# action names (last element of the path list) which only read data from bima-core
+READ_ACTIONS = ('list', 'read')
+
+# resources (first element of the path list) whose responses change after a write over another resource
+RELATED_RESOURCES = {
+    'albums': ('photos', 'search'),
+    'categories': ('categories-level', 'photos', 'search'),
+    'galleries': ('photos', 'search'),
+    'link': ('galleries', 'photos', 'search'),
+    'photos': ('albums', 'galleries', 'search'),
+    'users': ('whoami', ),
+}
+
+
+logger = logging.getLogger(__name__)
+
+# coalesces the identical read actions requested at the same time by several threads
+action_flight = SingleFlight()
+
+# marks the threads which are running a gathered call, to run nested gathers sequentially instead of
+# waiting for the same bounded pool
+_gather_local = threading.local()
+
+
 class ServiceClientException(Exception):
     """
     A base class for all `service client` exceptions.
@@ -40,6 +82,22 @@ class ServiceClientException(Exception):
                 self.code_text = coreapi_error.error.title
 
 
+class ServiceRequest(object):
+    """
+    Minimal request to build a service client out of the request/response cycle, i.e. in the rq jobs.
+    The user profile (and its token) must be in cache.
+    """
+
+    class User(object):
+        def __init__(self, user_id):
+            self.id = user_id
+
+    def __init__(self, user_id, language):
+        self.user = self.User(user_id)
+        self.META = {'HTTP_ACCEPT_LANGUAGE': language}
+        self.LANGUAGE_CODE = language
+
+
 class DAMPublicWebService(object):
     """
     For api requests without token
@@ -47,20 +105,31 @@ class DAMPublicWebService(object):
 
     def __init__(self, request):
         super(DAMPublicWebService, self).__init__()
-        api_url = join(settings.WS_BASE_URL, PUBLIC_API_SCHEMA_URL)
-
         self.request = request
-        self.client = Client()
+        self.client = get_client()
+        self._schema_index = None
+
+    @property
+    def schema_index(self):
+        """
+        Public api schema, cached in process and in cache, loaded on first use
+        """
+        if self._schema_index is None:
+            api_url = join(settings.WS_BASE_URL, PUBLIC_API_SCHEMA_URL)
+            self._schema_index = load_public_schema_index(lambda: self.client.get(api_url))
+        return self._schema_index
 
-        self.schema = self.client.get(api_url)
+    @property
+    def schema(self):
+        return self.schema_index.schema
 
     def password_reset(self, params):
         path_list = ['auth', 'password', 'reset', 'create']
-        return self.client.action(self.schema, path_list, params=params)
+        return self.schema_index.action(self.client, path_list, params=params)
 
     def password_reset_confirm(self, params):
         path_list = ['auth', 'password', 'reset', 'confirm', 'create']
-        return self.client.action(self.schema, path_list, params=params)
+        return self.schema_index.action(self.client, path_list, params=params)
 
 
 class DAMWebService(object):
@@ -74,31 +143,49 @@ class DAMWebService(object):
 
         self.request = request
         self.user_id = request.user.id
+        self.identity_map = {}
+        self._local = threading.local()
 
         # initialize api client with user token
-        user_params = cache.get("{}_{}".format(CACHE_USER_PROFILE_PREFIX_KEY, self.user_id))
+        profile_key = "{}_{}".format(CACHE_USER_PROFILE_PREFIX_KEY, self.user_id)
+        user_params = tiered_get(CACHE_USER_PROFILE_PREFIX_KEY, profile_key)
         authorization = {}
         if user_params and user_params.get('token'):
             authorization = {'Authorization': 'Token {}'.format(user_params.get('token'))}
         headers = dict(authorization)
         headers.update({'Accept-Language': request.META.get('HTTP_ACCEPT_LANGUAGE', request.LANGUAGE_CODE)})
 
-        transports = HTTPTransport(credentials=authorization, headers=headers,
-                                   response_callback=self._callback_client_transport)
-        self.client = Client(transports=[transports])
+        self.headers = headers
+        # cached responses are shared between the users with same language and permissions
+        self.language = get_accept_language(headers['Accept-Language'])
+        self.permission_scope = get_permission_fingerprint(user_params) if user_params else self.user_id
+        self.bulkhead_clients = {}
+        self.direct_transports = {}
+        self.client = get_client(headers=headers, response_callback=self._callback_client_transport)
 
-        # get api schema
-        schema_cache_key = "{}_{}".format(CACHE_SCHEMA_PREFIX_KEY, self.user_id)
-        self.schema = cache.get(schema_cache_key)
-        if not self.schema:
-            self.schema = self.get_or_logout(api_url)
-            cache.set(schema_cache_key, self.schema)
+        # get api schema, shared with the users with same permissions
+        self.schema_index = load_schema_index(self.user_id, lambda: self.get_or_logout(api_url), user_params)
+        self.schema = self.schema_index.schema
 
     def get_client_schema(self):
         return self.schema
 
+    @property
+    def transport_status_code(self):
+        """
+        Status code of the last response received by the current thread
+        """
+        return getattr(self._local, 'status_code', None)
+
+    def reset_transport_status_code(self):
+        """
+        Forgets the status code of the last response, so `transport_status_code` tells whether the next action
+        requests the api (i.e. it is not served from cache)
+        """
+        self._local.status_code = None
+
     def _callback_client_transport(self, response):
-        self.transport_status_code = response.status_code
+        self._local.status_code = response.status_code
 
     def get_or_logout(self, url):
         """
@@ -113,35 +200,477 @@ class DAMWebService(object):
         except CoreAPIException as e:
             raise ServiceClientException(self.transport_status_code, e)
 
+    def _run_call(self, call):
+        """
+        Runs a gathered call and returns a tuple of its result and its error
+        """
+        name, args, kwargs = call[0], (), {}
+        if len(call) > 1:
+            args = call[1]
+        if len(call) > 2:
+            kwargs = call[2]
+        running, _gather_local.running = getattr(_gather_local, 'running', False), True
+        try:
+            return getattr(self, name)(*args, **kwargs), None
+        except Exception as exc:
+            return None, exc
+        finally:
+            _gather_local.running = running
+
+    def gather(self, *calls, return_exceptions=False):
+        """
+        Runs several independent actions concurrently in the bounded thread pool, so the elapsed time is the one of
+        the slowest action instead of the sum of all of them.
+        :param calls: tuples of (action name, args, kwargs), args and kwargs are optional
+        :param return_exceptions: if set, errors are returned in place of their results, otherwise the first error
+                                  is raised once all the actions have finished
+        :return: list of results in the same order as the calls
+        """
+        if len(calls) > 1 and not getattr(_gather_local, 'running', False):
+            outcomes = list(get_executor().map(self._run_call, calls))
+        else:
+            outcomes = [self._run_call(call) for call in calls]
+
+        results = []
+        for result, error in outcomes:
+            if error is not None and not return_exceptions:
+                raise error
+            results.append(result if error is None else error)
+        return results
+
+    def defer(self, name, *args, **kwargs):
+        """
+        Runs an action in the deferred actions thread pool without waiting for it, for the actions whose response is
+        not used by the view, such as the logger ones. Errors are logged instead of raised. When the pool queue is
+        full, the action is enqueued in the rq 'back' queue instead.
+        :return: the future of the action, or None if it was enqueued
+        """
+        future = get_deferred_executor().try_submit(self._run_call, (name, args, kwargs))
+        if future is None:
+            self.enqueue_deferred(name, args, kwargs)
+            return None
+        future.add_done_callback(self._log_deferred_error)
+        return future
+
+    def enqueue_deferred(self, name, args, kwargs):
+        """
+        Enqueues a deferred action, to be run with the client of the same user and language
+        """
+        from .tasks import run_deferred_action
+
+        try:
+            run_deferred_action.delay(name, args, kwargs, self.user_id, self.headers['Accept-Language'])
+        except Exception:
+            logger.exception("Deferred action %s could not be enqueued", name)
+
+    def iter_all(self, action, prefetch=True, **filters):
+        """
+        Streams the results of every page of a list action, such as 'get_log_list', requesting the next page in the
+        thread pool while the current one is consumed. Pages are not memoized in the identity map, so no more than
+        two of them are held in memory at a time. The first page is requested at once, so its errors are raised here.
+        :param action: name of the list action
+        :param prefetch: whether to request the next page in advance. When False, a page is requested only once the
+        results of the previous one are consumed, for the callers which read only the first results (i.e. islice).
+        :param filters: parameters of the list action, the first page can be given with `page`
+        :return: iterator over the results
+        """
+        page = int(filters.pop('page', 1))
+        response = self._get_page(action, dict(filters, page=page))
+        return self._iter_pages(action, filters, page, response, prefetch)
+
+    def _iter_pages(self, action, filters, page, response, prefetch):
+        while response is not None:
+            pending = None
+            if response.get('next'):
+                page += 1
+                params = dict(filters, page=page)
+                pending = self._fetch_page(action, params) if prefetch else partial(self._get_page, action, params)
+            results, response = response['results'], None
+            yield from results
+            results = None
+            if pending is not None:
+                response = pending()
+
+    def _fetch_page(self, action, params):
+        """
+        Starts requesting a page in the thread pool and returns a callable which waits for it. It runs as a gathered
+        call, so the hedges and gathers it needs run inline instead of waiting for the pool they are running in.
+        From a pool thread (i.e. a gathered call) the page is requested when waited instead, as gather does.
+        """
+        if getattr(_gather_local, 'running', False):
+            return lambda: self._get_page(action, params)
+        future = get_executor().submit(self._run_call, ('_get_page', (action, params)))
+
+        def wait_page():
+            response, error = future.result()
+            if error is not None:
+                raise error
+            return response
+        return wait_page
+
+    def _get_page(self, action, params):
+        """
+        Requests a page of a list action without memoizing it
+        """
+        self._local.skip_identity_map = True
+        try:
+            return getattr(self, action)(**params)
+        finally:
+            self._local.skip_identity_map = False
+
+    @staticmethod
+    def _log_deferred_error(future):
+        result, error = future.result()
+        if error is not None:
+            logger.error("Deferred action failed: %r", error)
+
+    @staticmethod
+    def get_identity_key(path_list, params):
+        return tuple(path_list), tuple(sorted((key, repr(value)) for key, value in params.items()))
+
+    def evict_identity_map(self, resource):
+        """
+        Removes the memoized responses of the resource and of its related resources
+        """
+        resources = (resource, ) + RELATED_RESOURCES.get(resource, ())
+        self.identity_map = {key: value for key, value in self.identity_map.items() if key[0][0] not in resources}
+
     def action_or_logout(self, path_list, params, use_cache=False, clear_cache=False):
         """
-        to execute the action
+        to execute the action.
+        Read actions are memoized in the identity map for the client lifetime, that is, the request which uses it,
+        and the identical ones requested at the same time by other threads share a single request to the api.
+        Any other action evicts the memoized responses of its resource.
         """
+        is_read = path_list[-1] in READ_ACTIONS
+        if is_read:
+            identity_key = self.get_identity_key(path_list, params)
+            if identity_key in self.identity_map:
+                return self.identity_map[identity_key]
+        else:
+            self.evict_identity_map(path_list[0])
 
-        # get response from cache if use cache is
-        if use_cache:
-            cache_suffix_key = "_".join(["{}_{}".format(key, params[key]) for key in sorted(params.keys())])
-            cache_key = "{}_{}_{}".format("_".join(path_list), self.user_id, cache_suffix_key)
-            response = cache.get(cache_key)
-            if response:
-                return response
+        if is_read:
+            flight_key = (self.language, self.get_cache_key(path_list, params))
+            response = action_flight.do(flight_key, self._action_or_logout, path_list, params, use_cache=use_cache)
+            if not getattr(self._local, 'skip_identity_map', False):
+                self.identity_map[identity_key] = response
+            return response
+        return self._action_or_logout(path_list, params, use_cache=use_cache, clear_cache=clear_cache)
+
+    def get_object(self, resource, object_id):
+        """
+        Reads an object through the per-object cache, which is shared by the users with the same language and
+        permissions, or kept by user for the objects whose responses hold the permissions of the user on them.
+        Missing objects (404) are cached too, for a shorter time.
+        """
+        variant = get_object_variant(resource, self.language, self.permission_scope, self.user_id)
+        cached = get_cached_object(resource, object_id, variant)
+        if isinstance(cached, MissingObject):
+            raise ServiceClientException(HTTP_NOT_FOUND, cached.title)
+        if cached is not None:
+            return cached
 
-        # do request through api client
         try:
-            response = self.client.action(self.schema, path_list, params=params)
-            # clear all request related entries in cache
-            if clear_cache:
-                cache_delete_startswith(path_list[0])
-                return response
-            # if response successful status code
+            response = self.action_or_logout([resource, 'read'], params={'id': object_id})
+        except ServiceClientException as e:
+            if e.code_error == HTTP_NOT_FOUND:
+                set_cached_object(resource, object_id, variant, MissingObject(e.code_text))
+            raise
+        set_cached_object(resource, object_id, variant, response)
+        return response
+
+    def get_many(self, resource, object_ids):
+        """
+        Reads several objects at once from the list action of the resource filtered by id, skipping the ones already
+        cached. Ids are requested in chunks of WS_GET_MANY_CHUNK_SIZE, concurrently, and the objects read are cached.
+        :return: list of the objects found, in the same order as the given ids
+        """
+        object_ids = list(OrderedDict.fromkeys(str(object_id) for object_id in object_ids))
+        read_variant = get_object_variant(resource, self.language, self.permission_scope, self.user_id)
+        list_variant = read_variant + ('list', )
+        objects = get_cached_objects(resource, object_ids, (read_variant, list_variant))
+
+        pending = [object_id for object_id in object_ids if object_id not in objects]
+        chunk_size = getattr(settings, 'WS_GET_MANY_CHUNK_SIZE', 50)
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        fetched = {}
+        for results in self.gather(*[('get_many_chunk', (resource, chunk)) for chunk in chunks]):
+            fetched.update((str(result['id']), result) for result in results)
+        set_cached_objects(resource, fetched, list_variant)
+
+        objects.update(fetched)
+        return [objects[object_id] for object_id in object_ids if object_id in objects]
+
+    def get_many_chunk(self, resource, object_ids):
+        """
+        Returns all the results of the list action of the resource filtered by the given ids, following its pages
+        """
+        params, results = {'id': object_ids, 'page': 1}, []
+        while True:
+            response = self.action_or_logout([resource, 'list'], params=dict(params))
+            results.extend(response['results'])
+            if not response.get('next'):
+                return results
+            params['page'] += 1
+
+    def get_cache_key(self, path_list, params):
+        cache_suffix_key = "_".join(["{}_{}".format(key, params[key]) for key in sorted(params.keys())])
+        return "{}_{}_{}".format("_".join(path_list), self.user_id, cache_suffix_key)
+
+    def get_shared_cache_key(self, path_list, params):
+        """
+        Key of a cached taxonomy response, shared by the users with the same language and permissions: a hash of the
+        action, language, permission scope and normalized parameters, so its length is bounded
+        """
+        data = [list(path_list), self.language, self.permission_scope, normalize_params(params)]
+        digest = sha1(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+        return "{}_{}".format(CACHE_TAXONOMY_PREFIX_KEY, digest)
+
+    def get_stale_key(self, path_list, params, shared=False):
+        """
+        Key of the last successful response of an action. The one of a cached response is shared as the response
+        is, by the users with the same language and permissions; the rest are kept by user and language.
+        """
+        if shared:
+            return "stale_{}".format(self.get_shared_cache_key(path_list, params))
+        key = "{}_{}".format(self.language, self.get_cache_key(path_list, params))
+        return "stale_{}".format(sha1(key.encode('utf-8')).hexdigest())
+
+    def get_cached_response(self, path_list, params):
+        """
+        Returns a cached response, in the namespace of its resource, through the stampede-safe cache: only one node
+        requests it when it is missing. After WS_CACHE_SOFT_TTL seconds (or a bit earlier) it is still served and a
+        single refresh is enqueued in the rq 'back' queue (stale-while-revalidate). It is dropped after
+        WS_CACHE_HARD_TTL seconds.
+        """
+        cache_key = get_namespaced_key(path_list[0], self.get_shared_cache_key(path_list, params))
+        soft_ttl = getattr(settings, 'WS_CACHE_SOFT_TTL', 5 * 60)
+        return cache_get_or_compute(
+            cache_key,
+            lambda: self.get_shared_response(path_list, self.request_action(path_list, params, stale_if_error=True)),
+            soft_ttl,
+            stale_ttl=max(getattr(settings, 'WS_CACHE_HARD_TTL', 24 * 60 * 60) - soft_ttl, 0),
+            refresh=lambda: self.enqueue_refresh(cache_key, path_list, params),
+            lease_ttl=getattr(settings, 'WS_REFRESH_LOCK_TTL', 60),
+            getter=partial(tiered_get, CACHE_TAXONOMY_PREFIX_KEY),
+            setter=partial(tiered_set, CACHE_TAXONOMY_PREFIX_KEY),
+        )
+
+    @staticmethod
+    def get_shared_response(path_list, response):
+        """
+        Returns a response to be cached for the users with the same language and permissions: its objects as records,
+        without the permissions of the user on each photo, album or gallery
+        """
+        response = to_records(path_list, response)
+        if path_list[0] in USER_SCOPED_RESOURCES and isinstance(response, dict):
+            for item in response.get('results') or ():
+                if isinstance(item, MutableMapping):
+                    item.pop('permissions', None)
+        return response
+
+    def enqueue_refresh(self, cache_key, path_list, params):
+        """
+        Enqueues the refresh of a stale response. Its lease is held until the refresh ends, or for
+        WS_REFRESH_LOCK_TTL seconds, so no other refresh is enqueued meanwhile.
+        """
+        from .tasks import refresh_cached_response
+
+        try:
+            refresh_cached_response.delay(path_list, params, self.user_id, self.headers['Accept-Language'],
+                                          get_lease_key(cache_key))
+        except Exception:
+            logger.exception("Refresh of %s could not be enqueued", cache_key)
+
+    def refresh_cached_response(self, path_list, params, lease_key=None):
+        """
+        Requests a cached action again and stores its response, which other processes take at once
+        :param lease_key: the lease acquired when the refresh was enqueued, released when it ends, even if the key of
+                          the response has changed since
+        """
+        cache_key = get_namespaced_key(path_list[0], self.get_shared_cache_key(path_list, params))
+        soft_ttl = getattr(settings, 'WS_CACHE_SOFT_TTL', 5 * 60)
+        try:
+            return cache_compute(
+                cache_key,
+                lambda: self.get_shared_response(path_list, self.request_action(path_list, params)),
+                soft_ttl,
+                stale_ttl=max(getattr(settings, 'WS_CACHE_HARD_TTL', 24 * 60 * 60) - soft_ttl, 0),
+                setter=partial(tiered_set, CACHE_TAXONOMY_PREFIX_KEY, invalidate=True),
+            )
+        finally:
+            cache.delete(lease_key or get_lease_key(cache_key))
+
+    def _action_or_logout(self, path_list, params, use_cache=False, clear_cache=False):
+        try:
             if use_cache:
-                cache_set(cache_key, response)
+                return self.get_cached_response(path_list, params)
+
+            # do request through api client, the objects read are returned as compact records
+            response = to_records(path_list, self.request_action(path_list, params))
+            if clear_cache:
+                self.invalidate_namespaces(path_list[0])
             return response
         except ParameterError as e:
             raise ServiceClientException(HTTP_BAD_REQUEST, e)
         except CoreAPIException as e:
             raise ServiceClientException(self.transport_status_code, e)
 
+    @staticmethod
+    def invalidate_namespaces(resource):
+        """
+        Clears all the request related entries in cache: the namespaces of the resource and its related ones
+        """
+        for namespace in (resource, ) + RELATED_RESOURCES.get(resource, ()):
+            invalidate_namespace(namespace)
+
+    def request_action(self, path_list, params, stale_if_error=False):
+        """
+        Requests the action to the api through the circuit breaker of its endpoint, which records one outcome per
+        call, after its retries. Read actions are retried on transient errors with jittered exponential backoff, and
+        can fall back to their last successful response while the api fails (stale-if-error): the actions in
+        WS_STALE_IF_ERROR_ACTIONS and the cached ones.
+        """
+        action = ".".join(path_list)
+        is_read = path_list[-1] in READ_ACTIONS
+        stale_key = None
+        if is_read and (stale_if_error or action in getattr(settings, 'WS_STALE_IF_ERROR_ACTIONS', ())):
+            stale_key = self.get_stale_key(path_list, params, shared=stale_if_error)
+
+        circuit_breaker = get_circuit_breaker(action)
+        if not circuit_breaker.allow():
+            return self.get_stale_response(stale_key, ServiceClientException(503, 'Circuit open for {}'.format(action)))
+
+        attempts = get_retry_attempts(action) if is_read else 0
+        for attempt in range(attempts + 1):
+            self._local.status_code = None
+            try:
+                response = self.send_action(path_list, params)
+            except (CoreAPIException, RequestException) as e:
+                if not is_transient_error(e, self.transport_status_code):
+                    circuit_breaker.record_success()
+                    raise
+                if attempt == attempts or circuit_breaker.is_open:
+                    circuit_breaker.record_failure()
+                    return self.get_stale_response(stale_key, e)
+                time.sleep(get_backoff_delay(attempt))
+            else:
+                circuit_breaker.record_success()
+                if stale_key:
+                    cache_set(stale_key, response, getattr(settings, 'WS_STALE_TTL', 24 * 60 * 60))
+                return response
+
+    def get_bulkhead_client(self, name):
+        """
+        Returns the client which sends the requests through the connection pool of a bulkhead
+        """
+        if name not in self.bulkhead_clients:
+            self.bulkhead_clients[name] = get_client(headers=self.headers, session_name=name,
+                                                     response_callback=self._callback_client_transport)
+        return self.bulkhead_clients[name]
+
+    def get_direct_transport(self, name):
+        """
+        Returns the transport which sends the fast path actions through the connection pool of a bulkhead
+        """
+        if name not in self.direct_transports:
+            self.direct_transports[name] = DirectTransport(headers=self.headers, session_name=name,
+                                                           response_callback=self._callback_client_transport)
+        return self.direct_transports[name]
+
+    def dispatch(self, path_list, params):
+        """
+        Sends the action through the bulkhead of its class (reads, search, writes, exports...).
+        Fails fast when the bulkhead is full instead of queueing without limit.
+        The hot read actions in WS_FAST_PATH_ACTIONS skip the coreapi encoding and decoding.
+        """
+        action, is_read = ".".join(path_list), path_list[-1] in READ_ACTIONS
+        bulkhead = get_bulkhead(get_bulkhead_name(action, is_read))
+        if not bulkhead.acquire():
+            raise ServiceClientException(503, 'Too many concurrent requests in bulkhead {}'.format(bulkhead.name))
+        try:
+            if is_read and action in getattr(settings, 'WS_FAST_PATH_ACTIONS', ()):
+                return self.schema_index.direct_action(self.get_direct_transport(bulkhead.name), path_list, params)
+            return self.schema_index.action(self.get_bulkhead_client(bulkhead.name), path_list, params=params)
+        finally:
+            bulkhead.release()
+
+    def send_action(self, path_list, params):
+        """
+        Sends the action to the api. The hedged actions (WS_HEDGE_ACTIONS) are sent from the thread pool and, when
+        the request has not been answered after the hedge delay, a second identical request is sent too: the first
+        successful response wins. The error of the first request is raised if both fail.
+        """
+        policy = get_hedge_policy(".".join(path_list)) if path_list[-1] in READ_ACTIONS else None
+        if policy is None or getattr(_gather_local, 'running', False):
+            return self.dispatch(path_list, params)
+
+        start_hedged_request(policy)
+        executor = get_executor()
+        deadline = time.time() + sum(get_bulkhead_timeout(get_bulkhead_name(policy.action, True)))
+        primary = executor.submit(self._send_action, path_list, params)
+        primary.add_done_callback(partial(self._add_hedge_latency, policy))
+        pending, delay = {primary}, policy.get_delay()
+        if delay is not None:
+            wait(pending, timeout=min(delay, max(deadline - time.time(), 0)))
+            if not primary.done() and allow_hedge(policy):
+                pending.add(executor.submit(self._send_action, path_list, params))
+        return self._get_first_response(policy, primary, pending, deadline)
+
+    def _get_first_response(self, policy, primary, pending, deadline):
+        """
+        Returns the first successful response of the requests of a hedged action, counting a win when it is the one
+        of the hedge. Raises the error of the first request if all fail, or a timeout if none answers before the
+        deadline.
+        """
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.time(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in sorted(done, key=lambda done_future: done_future is not primary):
+                response, error, status_code, latency = future.result()
+                if error is None:
+                    self._local.status_code = status_code
+                    if future is not primary:
+                        record_hedge_win(policy)
+                    return response
+        if not primary.done():
+            raise Timeout('No response for {} before the request timeout'.format(policy.action))
+        response, error, status_code, latency = primary.result()
+        self._local.status_code = status_code
+        raise error
+
+    @staticmethod
+    def _add_hedge_latency(policy, future):
+        response, error, status_code, latency = future.result()
+        if error is None:
+            policy.add_latency(latency)
+
+    def _send_action(self, path_list, params):
+        """
+        Sends a request of a hedged action from a pool thread
+        :return: tuple of its response, error, response status code and latency
+        """
+        start = time.time()
+        self._local.status_code = None
+        try:
+            response, error = self.dispatch(path_list, params), None
+        except Exception as exc:
+            response, error = None, exc
+        return response, error, self.transport_status_code, time.time() - start
+
+    @staticmethod
+    def get_stale_response(stale_key, error):
+        """
+        Returns the last successful response of the action, or raises the error if there is none
+        """
+        response = cache_get(stale_key) if stale_key else None
+        if response is None:
+            raise error
+        logger.warning("Serving stale response %s: %r", stale_key, error)
+        return response
+
     # auth
 
     def password_change(self, params):
@@ -170,7 +699,7 @@ class DAMWebService(object):
     # groups
 
     def get_groups_list(self, **kwargs):
-        return self.action_or_logout(['groups', 'list'], params=kwargs)
+        return self.action_or_logout(['groups', 'list'], params=kwargs, use_cache=True)
 
     # albums
 
@@ -178,16 +707,20 @@ class DAMWebService(object):
         return self.action_or_logout(['albums', 'list'], params=kwargs)
 
     def get_album(self, album_id):
-        return self.action_or_logout(['albums', 'read'], params={'id': album_id})
+        return self.get_object('albums', album_id)
 
     def create_album(self, params):
         return self.action_or_logout(['albums', 'create'], params)
 
     def update_album(self, params):
-        return self.action_or_logout(['albums', 'partial_update'], params)
+        response = self.action_or_logout(['albums', 'partial_update'], params)
+        evict_objects('albums', params.get('id'))
+        return response
 
     def delete_album(self, album_id):
-        return self.action_or_logout(['albums', 'delete'], params={'id': album_id})
+        response = self.action_or_logout(['albums', 'delete'], params={'id': album_id})
+        evict_objects('albums', album_id)
+        return response
 
     # photos
 
@@ -197,20 +730,46 @@ class DAMWebService(object):
     def get_photos_list(self, **kwargs):
         return self.action_or_logout(['photos', 'list'], params=kwargs)
 
+    def get_public_photos_list(self, **kwargs):
+        """
+        Public photos list, cached since it is the same for every user with the same language and permissions.
+        The cached photos have no permissions of the user on them.
+        """
+        kwargs.update({'status': PHOTO_PUBLIC_STATUS})
+        return self.action_or_logout(['photos', 'list'], params=kwargs, use_cache=True)
+
     def get_photo(self, photo_id):
-        return self.action_or_logout(['photos', 'read'], params={'id': photo_id})
+        return self.get_object('photos', photo_id)
 
     def create_photo(self, params):
-        return self.action_or_logout(['photos', 'create'], params=params)
+        return self.action_or_logout(['photos', 'create'], params=params, clear_cache=True)
 
     def update_photo(self, params):
-        return self.action_or_logout(['photos', 'partial_update'], params)
+        response = self.action_or_logout(['photos', 'partial_update'], params, clear_cache=True)
+        evict_objects('photos', params.get('id'))
+        return response
 
-    def update_photo_multiple(self, params):
-        return self.action_or_logout(['photos', 'addition', 'partial_update'], params)
+    def update_photo_multiple(self, params, clear_cache=True):
+        """
+        Updates a photo of a batch. The batch callers pass clear_cache=False and call clear_photos_cache once
+        after the last photo, so the cache is not invalidated once per photo.
+        """
+        response = self.action_or_logout(['photos', 'addition', 'partial_update'], params, clear_cache=clear_cache)
+        if clear_cache:
+            evict_objects('photos', params.get('id'))
+        return response
+
+    def clear_photos_cache(self, photo_ids):
+        """
+        Invalidates the cached photo lists and related responses, and evicts the given photos from the object cache
+        """
+        self.invalidate_namespaces('photos')
+        evict_objects('photos', *photo_ids)
 
     def delete_photo(self, photo_id):
-        return self.action_or_logout(['photos', 'delete'], params={'id': photo_id})
+        response = self.action_or_logout(['photos', 'delete'], params={'id': photo_id}, clear_cache=True)
+        evict_objects('photos', photo_id)
+        return response
 
     # galleries
 
@@ -218,16 +777,20 @@ class DAMWebService(object):
         return self.action_or_logout(['galleries', 'list'], params=kwargs)
 
     def get_gallery(self, gallery_id):
-        return self.action_or_logout(['galleries', 'read'], params={'id': gallery_id})
+        return self.get_object('galleries', gallery_id)
 
     def create_gallery(self, params):
         return self.action_or_logout(['galleries', 'create'], params=params)
 
     def update_gallery(self, params):
-        return self.action_or_logout(['galleries', 'partial_update'], params)
+        response = self.action_or_logout(['galleries', 'partial_update'], params)
+        evict_objects('galleries', params.get('id'))
+        return response
 
     def delete_gallery(self, gallery_id):
-        return self.action_or_logout(['galleries', 'delete'], params={'id': gallery_id})
+        response = self.action_or_logout(['galleries', 'delete'], params={'id': gallery_id})
+        evict_objects('galleries', gallery_id)
+        return response
 
     # categories
 
@@ -247,16 +810,20 @@ class DAMWebService(object):
         return self.action_or_logout(['categories-level', 'list'], params=kwargs, use_cache=True)
 
     def get_category(self, category_id):
-        return self.action_or_logout(['categories', 'read'], params={'id': category_id}, use_cache=True)
+        return self.get_object('categories', category_id)
 
     def create_category(self, params):
         return self.action_or_logout(['categories', 'create'], params=params, clear_cache=True)
 
     def update_category(self, params):
-        return self.action_or_logout(['categories', 'update'], params, clear_cache=True)
+        response = self.action_or_logout(['categories', 'update'], params, clear_cache=True)
+        evict_objects('categories', params.get('id'))
+        return response
 
     def delete_category(self, category_id):
-        return self.action_or_logout(['categories', 'delete'], params={'id': category_id}, clear_cache=True)
+        response = self.action_or_logout(['categories', 'delete'], params={'id': category_id}, clear_cache=True)
+        evict_objects('categories', category_id)
+        return response
 
     # metadata
 
@@ -295,10 +862,19 @@ class DAMWebService(object):
     # link
 
     def create_link(self, params):
-        return self.action_or_logout(['link', 'create'], params=params)
+        response = self.action_or_logout(['link', 'create'], params=params)
+        evict_objects('photos', params.get('photo'))
+        evict_objects('galleries', params.get('gallery'))
+        return response
 
-    def delete_link(self, params):
-        return self.action_or_logout(['link', 'delete'], params=params)
+    def delete_link(self, params, photo=None, gallery=None):
+        """
+        The link is deleted by its id, so the linked photo and gallery are given to evict them from cache
+        """
+        response = self.action_or_logout(['link', 'delete'], params=params)
+        evict_objects('photos', photo)
+        evict_objects('galleries', gallery)
+        return response
 
     # logger
 
@@ -332,4 +908,4 @@ class DAMWebService(object):
     # photo type
 
     def get_photo_type_list(self, **params):
-        return self.action_or_logout(['types', 'list'], params=params)
+        return self.action_or_logout(['types', 'list'], params=params, use_cache=True)
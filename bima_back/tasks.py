@@ -2,15 +2,17 @@
 from os.path import join
 
 from constance import config
-from coreapi import Client
-from coreapi.transports import HTTPTransport
 from django.conf import settings
-from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django_rq import job
 
-from .utils import cache_set
-from .constants import CACHE_SCHEMA_PREFIX_KEY, PRIVATE_API_SCHEMA_URL
+from .objects import evict_objects
+from .schemas import load_schema_index
+from .service import DAMWebService, ServiceRequest
+from .warming import warm_cache
+from .transports import get_client
+from .utils import cache_get, invalidate_namespace
+from .constants import CACHE_USER_PROFILE_PREFIX_KEY, PRIVATE_API_SCHEMA_URL
 from .models import MyChunkedUpload
 
 BOUNDARY = 'BoUnDaRyStRiNg'
@@ -35,15 +37,11 @@ def upload_photo(form_data, user_id, user_token, lang, create=True):
     headers = dict(authorization)
     headers.update({'Accept-Language': lang, 'content_type': MULTIPART_CONTENT})
 
-    transports = HTTPTransport(credentials=authorization, headers=headers)
-    client = Client(transports=[transports])
+    client = get_client(headers=headers)
 
     # get api schema
-    schema_cache_key = "{}_{}".format(CACHE_SCHEMA_PREFIX_KEY, user_id)
-    schema = cache.get(schema_cache_key)
-    if not schema:
-        schema = client.get(api_url)
-        cache_set(schema_cache_key, schema)
+    user_params = cache_get("{}_{}".format(CACHE_USER_PROFILE_PREFIX_KEY, user_id))
+    schema_index = load_schema_index(user_id, lambda: client.get(api_url), user_params)
 
     # get image to upload
     upload_id = form_data.pop('upload_id')
@@ -59,9 +57,9 @@ def upload_photo(form_data, user_id, user_token, lang, create=True):
 
     for chunk_file in chunks:
         data.update(**{'file': ContentFile(chunk_file)})
-        client.transports[0].headers._data['Content-Range'] = 'bytes {}-{}/{}'.format(
+        client.transports[0].request_headers['Content-Range'] = 'bytes {}-{}/{}'.format(
             offset, offset + len(chunk_file), image_file.size)
-        response = client.action(schema, request_path, params=data)
+        response = schema_index.action(client, request_path, params=data)
         offset = response['offset']
         img_id = response['id']
         data.update({'id': img_id})
@@ -69,16 +67,42 @@ def upload_photo(form_data, user_id, user_token, lang, create=True):
 
     request_path = ['photos', 'upload', 'chunk', 'create']
     data.update({'md5': _checksum_file(image_file, chunk_size)})
-    client.action(schema, request_path, params=data)
+    schema_index.action(client, request_path, params=data)
 
     # Request is not multipart, so we remove the header, otherwise uwsgi doesn't works
-    client.transports[0].headers._data.pop('content_type', None)
+    client.transports[0].request_headers.pop('content_type', None)
 
     # upload photo information
     form_data['image'] = img_id
     form_data['original_file_name'] = filename
     if create:
         form_data['owner'] = user_id
-        client.action(schema, ['photos', 'create'], params=form_data)
+        schema_index.action(client, ['photos', 'create'], params=form_data)
     else:
-        client.action(schema, ['photos', 'partial_update'], params=form_data)
+        schema_index.action(client, ['photos', 'partial_update'], params=form_data)
+        evict_objects('photos', form_data.get('id'))
+    invalidate_namespace('photos')
+
+
+@job('back', timeout=settings.JOB_DEFAULT_TIMEOUT)
+def refresh_cached_response(path_list, params, user_id, lang, lease_key=None):
+    """
+    Requests again a cached response served stale, with the client of the user who read it, and releases its lease
+    """
+    DAMWebService(ServiceRequest(user_id, lang)).refresh_cached_response(path_list, params, lease_key)
+
+
+@job('back', timeout=settings.JOB_DEFAULT_TIMEOUT)
+def run_deferred_action(name, args, kwargs, user_id, lang):
+    """
+    Runs a deferred action (see DAMWebService.defer) which did not fit in the deferred actions thread pool
+    """
+    getattr(DAMWebService(ServiceRequest(user_id, lang)), name)(*args, **kwargs)
+
+
+@job('back', timeout=settings.JOB_DEFAULT_TIMEOUT)
+def warm_cache_job():
+    """
+    Cache warming run, usually scheduled (see warming.schedule_cache_warming). Returns the run report.
+    """
+    return str(warm_cache())
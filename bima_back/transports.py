@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+import os
+import threading
+
+from coreapi import Client
+from coreapi.document import Error
+from coreapi.exceptions import ErrorMessage, ParameterError
+from coreapi.transports import HTTPTransport
+from coreapi.utils import validate_path_param, validate_query_param
+from django.conf import settings
+import requests
+from requests.adapters import HTTPAdapter
+import uritemplate
+
+try:
+    import ujson as fast_json
+except ImportError:  # pragma: no cover
+    import json as fast_json
+
+from .constants import DEFAULT_BULKHEADS
+
+
+_sessions = {}
+_sessions_pid = None
+_session_lock = threading.Lock()
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+_deferred_executor = None
+_deferred_executor_pid = None
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    Http adapter which applies a default timeout to the requests sent without one
+    """
+
+    def __init__(self, timeout=None, *args, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def get_session_timeout():
+    """
+    Returns the (connect, read) timeout set in settings
+    """
+    return getattr(settings, 'WS_CONNECT_TIMEOUT', 5), getattr(settings, 'WS_READ_TIMEOUT', 60)
+
+
+def get_bulkhead_timeout(name):
+    """
+    Returns the (connect, read) timeout of the requests of a bulkhead
+    """
+    return get_bulkhead_options(name).get('timeout', get_session_timeout())
+
+
+def get_bulkhead_options(name):
+    """
+    Returns the options of a bulkhead: its defaults updated with the WS_BULKHEADS setting
+    """
+    options = dict(DEFAULT_BULKHEADS.get(name, {}))
+    options.update(getattr(settings, 'WS_BULKHEADS', {}).get(name, {}))
+    return options
+
+
+def build_session(name=None):
+    """
+    Returns a new http session with a keep-alive connection pool sized in settings.
+    The sessions of the bulkheads use their own pool size and timeout. They are shared by every user, so they
+    accept no cookies: one set by the api for a user would be sent with the requests of the rest.
+    """
+    options = get_bulkhead_options(name) if name else {}
+    session = requests.Session()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = TimeoutHTTPAdapter(
+        timeout=get_bulkhead_timeout(name) if name else get_session_timeout(),
+        pool_connections=getattr(settings, 'WS_POOL_CONNECTIONS', 1),
+        pool_maxsize=options.get('pool_maxsize', getattr(settings, 'WS_POOL_MAXSIZE', 10)),
+        max_retries=getattr(settings, 'WS_MAX_RETRIES', 0),
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session(name=None):
+    """
+    Returns the process-wide http session shared by all the service clients, or the one of a bulkhead.
+    Forked processes (i.e. rq workers) build their own sessions instead of reusing the parent sockets.
+    """
+    global _sessions_pid
+    pid = os.getpid()
+    session = _sessions.get(name) if _sessions_pid == pid else None
+    if session is None:
+        with _session_lock:
+            if _sessions_pid != pid:
+                _sessions.clear()
+                _sessions_pid = pid
+            session = _sessions.get(name)
+            if session is None:
+                session = _sessions[name] = build_session(name)
+    return session
+
+
+def get_executor():
+    """
+    Returns the process-wide bounded thread pool used to run concurrent requests to the api.
+    Its size (WS_GATHER_MAX_WORKERS) should not exceed the connection pool size (WS_POOL_MAXSIZE).
+    """
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                max_workers = getattr(settings, 'WS_GATHER_MAX_WORKERS', 8)
+                _executor, _executor_pid = ThreadPoolExecutor(max_workers=max_workers), pid
+    return _executor
+
+
+class BoundedExecutor(object):
+    """
+    Thread pool which holds at most `queue_size` pending calls besides the running ones: `try_submit` returns None
+    instead of queueing more. As any thread pool, its pending calls are run before the process exits.
+    """
+
+    def __init__(self, max_workers, queue_size):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max_workers + queue_size)
+
+    def _release_slot(self, future):
+        self._slots.release()
+
+    def try_submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            return None
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._release_slot)
+        return future
+
+
+def get_deferred_executor():
+    """
+    Returns the process-wide small thread pool which runs the deferred actions (i.e. the logger ones), apart from
+    the gather one so they never delay the requests a view waits for. Sized with WS_DEFER_MAX_WORKERS, it holds
+    at most WS_DEFER_QUEUE_SIZE pending actions.
+    """
+    global _deferred_executor, _deferred_executor_pid
+    pid = os.getpid()
+    if _deferred_executor is None or _deferred_executor_pid != pid:
+        with _executor_lock:
+            if _deferred_executor is None or _deferred_executor_pid != pid:
+                _deferred_executor = BoundedExecutor(getattr(settings, 'WS_DEFER_MAX_WORKERS', 2),
+                                                     getattr(settings, 'WS_DEFER_QUEUE_SIZE', 100))
+                _deferred_executor_pid = pid
+    return _deferred_executor
+
+
+class ServiceTransport(HTTPTransport):
+    """
+    Http transport over the pooled session. The client headers (authorization, language...) are not stored
+    in the transport but added to each request before sending it.
+    """
+
+    def __init__(self, headers=None, response_callback=None, session_name=None):
+        super().__init__(session=get_session(session_name), request_callback=self._add_request_headers,
+                         response_callback=response_callback)
+        self._request_headers = dict(headers or {})
+
+    @property
+    def request_headers(self):
+        return self._request_headers
+
+    def _add_request_headers(self, request):
+        request.headers.update(self._request_headers)
+
+
+def get_client(headers=None, response_callback=None, session_name=None):
+    """
+    Returns a coreapi client which sends its requests through the pooled session, or the one of a bulkhead
+    """
+    transport = ServiceTransport(headers=headers, response_callback=response_callback, session_name=session_name)
+    return Client(transports=[transport])
+
+
+class DirectTransport(object):
+    """
+    Transport for the hot read actions (WS_FAST_PATH_ACTIONS) which skips the coreapi encoding and decoding:
+    it expands the compiled link url, requests it through the pooled session and decodes the json response into
+    plain python data with the fastest json decoder available. Errors are raised as coreapi ones, so they are
+    mapped the same way whatever the transport.
+    """
+
+    def __init__(self, headers=None, response_callback=None, session_name=None):
+        self.session = get_session(session_name)
+        self.headers = {'Accept': 'application/json'}
+        self.headers.update(headers or {})
+        self.response_callback = response_callback
+
+    @staticmethod
+    def get_params(compiled_link, params):
+        """
+        Splits the params into path and query ones, validated as coreapi does
+        """
+        path, query, errors = {}, {}, {}
+        for key, value in params.items():
+            try:
+                if compiled_link.locations.get(key) == 'path':
+                    path[key] = validate_path_param(value)
+                else:
+                    query[key] = validate_query_param(value)
+            except ParameterError as exc:
+                errors[key] = "%s" % exc
+        if errors:
+            raise ParameterError(errors)
+        return path, query
+
+    @staticmethod
+    def decode(response):
+        if not response.content:
+            return None
+        return fast_json.loads(response.content.decode('utf-8'))
+
+    def request(self, compiled_link, params):
+        path, query = self.get_params(compiled_link, params)
+        url = uritemplate.expand(compiled_link.url, path) if path else compiled_link.url
+        response = self.session.request(compiled_link.method, url, params=query, headers=self.headers)
+        if self.response_callback is not None:
+            self.response_callback(response)
+
+        try:
+            result = self.decode(response)
+        except ValueError:
+            result = response.text
+        if 400 <= response.status_code <= 599:
+            raise ErrorMessage(self.get_error(result, response.reason))
+        return result
+
+    @staticmethod
+    def get_error(content, title):
+        """
+        Returns the error as coreapi builds it from an error response
+        """
+        if isinstance(content, dict):
+            return Error(title=title, content=content)
+        elif isinstance(content, list):
+            return Error(title=title, content={'messages': content})
+        elif content is None:
+            return Error(title=title)
+        return Error(title=title, content={'message': content})
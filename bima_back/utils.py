@@ -1,12 +1,21 @@
 # -*- coding: utf-8 -*-
+from collections import namedtuple
 from datetime import datetime
 import logging
 from itertools import groupby
+import math
 from operator import itemgetter
+import random
+import threading
+import time
 
 from django.conf import settings
 from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
 from django.utils.translation import ugettext as _
+from django.utils.translation.trans_real import get_supported_language_variant, parse_accept_lang_header
+
+from . import cache_serializers
 
 
 logger = logging.getLogger(__name__)
@@ -78,6 +87,36 @@ def get_language_codes():
     return get_languages(names=False)
 
 
+def get_accept_language(accept_language):
+    """
+    Returns the supported language chosen from an Accept-Language header, the one which the api answers in,
+    or the normalized header if none of its languages is supported
+    """
+    for code, quality in parse_accept_lang_header(accept_language or ''):
+        if code == '*':
+            break
+        try:
+            return get_supported_language_variant(code)
+        except LookupError:
+            continue
+    return (accept_language or '').strip().lower()
+
+
+def normalize_params(params):
+    """
+    Returns the request parameters in a canonical form, as they are sent in the query string: values as strings and
+    multiple values sorted
+    """
+    normalized = {}
+    for key, value in params.items():
+        if is_iterable(value):
+            value = sorted(str(item) for item in value)
+        elif value is not None:
+            value = str(value)
+        normalized[str(key)] = value
+    return normalized
+
+
 def order_keywords(keywords):
     """
     Returns keywords grouped by languages
@@ -227,14 +266,281 @@ def is_available_cache():
     return settings.CACHE_ENABLED and 'dummycache' not in cache_backend.lower()
 
 
-def cache_set(key, value):
+def cache_set(key, value, timeout=DEFAULT_TIMEOUT):
     if is_available_cache():
-        cache.set(key, value)
+        forget_prefetched(key)
+        cache.set(key, cache_serializers.dumps(key, value), timeout)
 
 
-def cache_delete_startswith(key):
+def cache_set_many(values, timeout=DEFAULT_TIMEOUT):
     if is_available_cache():
-        cache.delete_many(cache.keys("{}*".format(key)))
+        forget_prefetched(*values)
+        cache.set_many({key: cache_serializers.dumps(key, value) for key, value in values.items()}, timeout)
+
+
+def cache_delete(key):
+    forget_prefetched(key)
+    cache.delete(key)
+
+
+def cache_get(key, default=None):
+    """
+    Returns a value stored with `cache_set`, from the keys prefetched by the thread if it is one of them
+    """
+    prefetched = get_prefetched()
+    data = prefetched[key] if key in prefetched else cache.get(key)
+    if data is None:
+        return default
+    return cache_serializers.loads(key, data)
+
+
+def cache_get_many(keys):
+    """
+    Returns the values stored with `cache_set` by key, the missing ones left out
+    """
+    prefetched = get_prefetched()
+    entries = {key: prefetched[key] for key in keys if key in prefetched}
+    missing = [key for key in keys if key not in entries]
+    if missing:
+        entries.update(cache.get_many(missing))
+    return {key: cache_serializers.loads(key, data) for key, data in entries.items() if data is not None}
+
+
+# Cache namespaces: every namespaced key embeds the current generation of its namespace, so a namespace is invalidated
+# with a single atomic increment of its generation, and its old entries expire through their timeout.
+# A lost generation restarts from the current time in milliseconds, never from a generation already used.
+# The generations read are kept in process for WS_GENERATION_CHECK_INTERVAL seconds, so the invalidations made by
+# other processes are seen after that interval at most.
+
+# generations of the namespaces read by the process: namespace -> (time it was read, generation)
+_generations = {}
+
+
+def get_generation_key(namespace):
+    return "generation_{}".format(namespace)
+
+
+def get_known_generation(namespace):
+    """
+    Returns the generation of a namespace kept in process, or None if it has to be read again
+    """
+    read_at, generation = _generations.get(namespace, (0, None))
+    if generation is not None and time.time() - read_at < getattr(settings, 'WS_GENERATION_CHECK_INTERVAL', 1):
+        return generation
+    return None
+
+
+def get_namespace_generation(namespace):
+    if not is_available_cache():
+        return 0
+    generation = get_known_generation(namespace)
+    if generation is not None:
+        return generation
+    key = get_generation_key(namespace)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, int(time.time() * 1000), None)
+        generation = cache.get(key, 0)
+    _generations[namespace] = (time.time(), generation)
+    return generation
+
+
+def get_namespaced_key(namespace, key):
+    """
+    Returns the key in the current generation of the namespace
+    """
+    return "{}_{}_{}".format(namespace, get_namespace_generation(namespace), key)
+
+
+def invalidate_namespace(namespace):
+    """
+    Invalidates all the keys of a namespace, without scanning the cache keys
+    """
+    if not is_available_cache():
+        return
+    bump_version(get_generation_key(namespace))
+    _generations.pop(namespace, None)
+
+
+def bump_version(key, timeout=None):
+    """
+    Increments a version (or generation) counter stored raw in cache, which restarts from the current time in
+    milliseconds when it is lost or expired
+    :param timeout: seconds the counter is kept after it restarts, forever by default
+    :return: the new version
+    """
+    forget_prefetched(key)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), timeout)
+        return cache.get(key)
+
+
+# Per-request cache prefetch: the keys a request is going to read are fetched with a single get_many when it starts
+# (see middleware.CachePrefetchMiddleware), and the `cache_get` of the thread serving it take them from that batch,
+# the missing ones too. The keys written meanwhile are dropped from the batch. The threads of the gather pool read the
+# cache as usual.
+
+_prefetched = threading.local()
+
+
+def cache_prefetch(keys, namespaces=()):
+    """
+    Reads at once the given keys and the generations of the given namespaces. The generations are kept in process
+    as if they had been read one by one, and the values are served to the `cache_get` of the current thread until
+    `clear_cache_prefetch`.
+    """
+    generation_keys = {get_generation_key(namespace): namespace for namespace in namespaces}
+    keys = list(keys) + list(generation_keys)
+    entries = cache.get_many(keys) if keys and is_available_cache() else {}
+    read_at = time.time()
+    for key, namespace in generation_keys.items():
+        if key in entries:
+            _generations[namespace] = (read_at, entries[key])
+    _prefetched.entries = {key: entries.get(key) for key in keys if key not in generation_keys}
+
+
+def clear_cache_prefetch():
+    _prefetched.entries = {}
+
+
+def get_prefetched():
+    return getattr(_prefetched, 'entries', None) or {}
+
+
+def forget_prefetched(*keys):
+    entries = get_prefetched()
+    for key in keys:
+        entries.pop(key, None)
+
+
+# Stampede protection: a value computed from the api is stored with the time its computation took and the time it
+# expires. Before it expires, each reader recomputes it early with a probability which grows as the expiration
+# approaches and with the computation time (XFetch), so hot values are recomputed before they expire.
+# Only the reader which takes the lease of the key (a short lock in cache shared by all the nodes) recomputes it,
+# while the rest serve the previous value if any, or wait for the new one up to WS_CACHE_LEASE_WAIT seconds.
+
+ComputedValue = namedtuple('ComputedValue', ['value', 'delta', 'expires'])
+
+
+def get_lease_key(key):
+    return "lease_{}".format(key)
+
+
+def get_timeout_seconds(timeout):
+    return cache.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+
+def is_expired_early(entry, now):
+    """
+    Whether a computed value has to be recomputed, which is randomly advanced to `delta * beta * -log(random)`
+    seconds before its expiration, being beta WS_CACHE_EARLY_BETA
+    """
+    if entry.expires is None:
+        return False
+    beta = getattr(settings, 'WS_CACHE_EARLY_BETA', 1)
+    return now - entry.delta * beta * math.log(1 - random.random()) >= entry.expires
+
+
+def cache_compute(key, compute, timeout=DEFAULT_TIMEOUT, stale_ttl=0, setter=cache_set):
+    """
+    Computes a value and stores it, unless it is None, as a ComputedValue. It is kept in cache `stale_ttl` seconds
+    after it expires, to serve it while it is recomputed.
+    """
+    start = time.time()
+    value = compute()
+    delta = time.time() - start
+    if value is not None:
+        timeout = get_timeout_seconds(timeout)
+        expires = None if timeout is None else start + delta + timeout
+        setter(key, ComputedValue(value, delta, expires), None if timeout is None else timeout + stale_ttl)
+    return value
+
+
+def wait_for_value(key, compute, getter=cache_get, is_valid=None):
+    """
+    Waits for the value which another node is computing, and computes it if it does not arrive in time
+    """
+    deadline = time.time() + getattr(settings, 'WS_CACHE_LEASE_WAIT', 2)
+    while time.time() < deadline and cache.get(get_lease_key(key)):
+        time.sleep(getattr(settings, 'WS_CACHE_LEASE_POLL', 0.05))
+        entry = getter(key)
+        if isinstance(entry, ComputedValue) and (is_valid is None or is_valid(entry.value)):
+            return entry.value
+    return compute()
+
+
+def cache_get_or_compute(key, compute, timeout=DEFAULT_TIMEOUT, stale_ttl=0, refresh=None, is_valid=None,
+                         lease_ttl=None, getter=cache_get, setter=cache_set):
+    """
+    Stampede-safe read-through cache: returns the cached value of the key, or computes and stores it holding its lease.
+    :param compute: callable which returns the value
+    :param timeout: seconds the value is fresh
+    :param stale_ttl: seconds the value is served after it expires, while it is recomputed
+    :param refresh: callable which recomputes the value in background, i.e. enqueuing a job which calls
+                    `cache_compute` and releases the lease. If set, expired values are served while they are refreshed.
+    :param is_valid: callable which tells if a cached value can be used
+    :param lease_ttl: seconds the lease is held at most, WS_CACHE_LEASE_TTL by default
+    :param getter: function which reads the cache, i.e. a tiered one
+    :param setter: function which writes the cache
+    """
+    entry = getter(key)
+    if not isinstance(entry, ComputedValue) or (is_valid is not None and not is_valid(entry.value)):
+        entry = None
+    elif not is_expired_early(entry, time.time()):
+        return entry.value
+
+    lease_key = get_lease_key(key)
+    lease_ttl = lease_ttl or getattr(settings, 'WS_CACHE_LEASE_TTL', 10)
+    if not is_available_cache():
+        return compute()
+    if not cache.add(lease_key, 1, lease_ttl):
+        return entry.value if entry is not None else wait_for_value(key, compute, getter, is_valid)
+    if entry is not None and refresh is not None:
+        refresh()
+        return entry.value
+    try:
+        return cache_compute(key, compute, timeout, stale_ttl, setter)
+    finally:
+        cache.delete(lease_key)
+
+
+# Request coalescing
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the function while the others wait for it
+    and share its result, or its error.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self.lock:
+            call = self.calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self.calls[key] = {'event': threading.Event(), 'result': None, 'error': None}
+
+        if not is_leader:
+            call['event'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = func(*args, **kwargs)
+            return call['result']
+        except Exception as exc:
+            call['error'] = exc
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call['event'].set()
 
 
 # Decorator to analyze performance
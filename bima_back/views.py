@@ -6,9 +6,8 @@ from braces.views import JSONResponseMixin, AjaxResponseMixin
 from chunked_upload.views import ChunkedUploadView, ChunkedUploadCompleteView
 from django.conf import settings
 from django.contrib import messages
-from django.core.cache import cache
 from django.core.urlresolvers import reverse, reverse_lazy
-from django.http import Http404, HttpResponse, JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect
 from django.utils.translation import ugettext as _
 from django.views.generic.base import View, TemplateView, RedirectView
@@ -19,12 +18,13 @@ from .exports import LogReport
 from .forms import AlbumForm, PhotoCreateForm, UserForm, GalleryForm, PhotoEditForm, \
     CategoryForm, FlickrForm, LogFilterForm, PhotoEditMultipleForm, AdvancedSemanticSearchForm, \
     AlbumPhotoCreateForm, AlbumFlickrForm, CategoryFilterForm
+from .local_cache import tiered_get, tiered_set
 from .mixins import ServiceClientMixin, LoggedServicePaginatorMixin, LoggedServiceMixin, FilterFormMixin, \
     PaginatorMixin, PhotoMixin, AlbumMixin, GalleryMixin, CategoryMixin
 from .models import MyChunkedUpload
 from .tasks import upload_photo
 from .utils import get_language_codes, get_class_name, get_choices_ids, get_choices, get_tag_choices, format_date, \
-    cache_set, prepare_params, change_form_tag_languages
+    prepare_params, change_form_tag_languages
 from .service import UploadStatus
 
 
@@ -91,6 +91,7 @@ class PhotoListView(PhotoMixin, BaseListView):
     action_name = 'get_photos_list'
     form_class = AdvancedSemanticSearchForm
     active_section = 'photo'
+    cache_namespaces = ('categories', 'types')
 
     def service_list_function(self, **kwargs):
         """
@@ -104,32 +105,28 @@ class PhotoListView(PhotoMixin, BaseListView):
             kwargs.update({'q': q_filter})
         return self.get_client_action(self.action_name)(**kwargs)
 
-    def get_instance_list(self, action, params):
-        """
-        Do request through API to get list of items filtered by id.
-        :param action: string of method definition name of client api service.
-        :param params: value or list of values to filter
-        """
-        return self.get_client_action(action)(**{'id': params})['results']
-
     def get_form_context(self):
         """
-        Iterate over 'request_for_fields' list defined as multiple elements of <<field, service_action>>, to build
-        a dictionary for all fields which have values. It gets a single value or list according the
-        'multi_valuated_fields' field list.
+        Iterate over 'request_for_fields' list defined as multiple elements of <<field, service_action, resource>>, to
+        build a dictionary for all fields which have values. It gets a single value or list according the
+        'multi_valuated_fields' field list. The lists of all fields are requested at the same time, and the
+        albums and galleries are read by id through the object cache.
         """
-        context = {}
-        request_for_fields = (('album', 'get_albums_list'), ('categories', 'get_categories_simple_list'),
-                              ('gallery', 'get_galleries_list'))
+        request_for_fields = (('album', 'get_many', 'albums'), ('categories', 'get_categories_simple_list', None),
+                              ('gallery', 'get_many', 'galleries'))
         if getattr(settings, 'PHOTO_TYPES_ENABLED', False):
-            request_for_fields += (('photo_type', 'get_photo_type_list'), )
+            request_for_fields += (('photo_type', 'get_photo_type_list', None), )
 
-        for field, action in request_for_fields:
+        fields, calls = [], []
+        for field, action, resource in request_for_fields:
             get_values = getattr(self.request.GET, 'getlist', [])
             value = get_values(field)
             if value:
-                context.update({field: self.get_instance_list(action, value)})
-        return context
+                fields.append(field)
+                calls.append((action, (resource, value)) if resource else (action, (), {'id': value}))
+        responses = self.get_client().gather(*calls)
+        return {field: response if isinstance(response, list) else response['results']
+                for field, response in zip(fields, responses)}
 
     def get_form_kwargs(self):
         """
@@ -161,6 +158,7 @@ class CategoryListView(BaseListView):
     action_name = 'get_categories_level_list'
     form_class = CategoryFilterForm
     active_section = 'category'
+    cache_namespaces = ('categories-level', )
 
     def add_params(self, params):
         """
@@ -223,6 +221,8 @@ class CategoryListView(BaseListView):
 
 
 class CategoryChildrenAjaxListView(JSONResponseMixin, AjaxResponseMixin, LoggedServiceMixin, View):
+    cache_namespaces = ('categories-level', )
+
     def get_ajax(self, request, *args, **kwargs):
         action = self.get_client_action('get_categories_level_list')
         params = {'parent': request.GET.get('parent')}
@@ -238,13 +238,13 @@ class LogListView(BaseListView):
 
     def get_context_data(self, **kwargs):
         """
-        If csv export requested, adds the resulting logs to the context
+        If csv export requested, adds an iterator over the logs of all the pages to the context
         """
         if 'csv' in self.request.GET.get('export', ''):
             params = self.request.GET.dict()
             params.pop('export', None)  # param not supported by service
-            response = self.service_list_function(**params)
-            return {'export-report': response['results']}
+            params.pop('page', None)  # all the pages are exported
+            return {'export-report': self.get_client().iter_all(self.action_name, **params)}
         return super().get_context_data(**kwargs)
 
     def render_to_response(self, context, **response_kwargs):
@@ -255,7 +255,7 @@ class LogListView(BaseListView):
         # Sniff if we need to return a CSV export
         if 'export-report' in context:
             report = LogReport(data=context.get('export-report'), user=self.request.user)
-            response = HttpResponse(report.csv, content_type=report.content_type)
+            response = StreamingHttpResponse(report.stream(), content_type=report.content_type)
             response['Content-Disposition'] = 'attachment; filename="{}"'.format(report.file_name)
             return response
         return super(LogListView, self).render_to_response(context, **response_kwargs)
@@ -321,7 +321,9 @@ class AlbumPublicListView(FilteredPhotoListBaseView):
     """
     View to list all public photos
     """
+    action_name = 'get_public_photos_list'
     active_section = 'album'
+    cache_namespaces = ('photos', )
 
     def add_params(self, params):
         params.update({'status': 1})
@@ -690,7 +692,7 @@ class PhotoEditView(PhotoMixin, BaseEditView):
         context = super().get_context_data(**kwargs)
         if context['instance']['upload_status'] == UploadStatus.uploading:
             raise Http404('Photo is being uploaded.')
-        self.get_client().logger_view({'photo': self.kwargs['pk']})
+        self.get_client().defer('logger_view', {'photo': self.kwargs['pk']})
         return context
 
     def edit_params(self, data):
@@ -749,13 +751,13 @@ class PhotoEditView(PhotoMixin, BaseEditView):
         # we need the id of the link in order to delete it
         # we get in from the info in photo['photo_galleries'] key 'id'
         delete_galleries = [gallery for gallery in initial_galleries if gallery not in current_galleries]
-        delete_links = [gallery_info['id'] for gallery_info in form.initial['extra_info']['photo_galleries']
+        delete_links = [gallery_info for gallery_info in form.initial['extra_info']['photo_galleries']
                         if str(gallery_info['gallery']) in delete_galleries]
 
         for old_link in delete_links:
             self.get_client().delete_link({
-                'id': old_link
-            })
+                'id': old_link['id']
+            }, photo=self.kwargs['pk'], gallery=old_link['gallery'])
 
     def get_breadcrumbs(self):
         return [{'label': _('Albums'), 'view': 'album_list'},
@@ -797,9 +799,12 @@ class PhotoEditMultipleView(LoggedServiceMixin, FormView):
         if cleaned_data:
             # categorize date
             cleaned_data['categorize_date'] = format_date(datetime.now(), final="%Y-%m-%d", isoformat=False)
-            for photo in editable_photos:
-                cleaned_data['id'] = photo
-                self.get_client().update_photo_multiple(cleaned_data)
+            try:
+                for photo in editable_photos:
+                    cleaned_data['id'] = photo
+                    self.get_client().update_photo_multiple(cleaned_data, clear_cache=False)
+            finally:
+                self.get_client().clear_photos_cache(editable_photos)
 
         # delete session cart
         self.request.session['cart'] = {}
@@ -824,9 +829,12 @@ class PhotoEditTagsRedirectView(LoggedServiceMixin, RedirectView):
             'categories': selected_photo['categories'],
             'names': selected_photo['names'],
         }
-        for photo in editable_photos:
-            data['id'] = photo
-            self.get_client().update_photo_multiple(data)
+        try:
+            for photo in editable_photos:
+                data['id'] = photo
+                self.get_client().update_photo_multiple(data, clear_cache=False)
+        finally:
+            self.get_client().clear_photos_cache(editable_photos)
         messages.success(self.request, _("Your transaction completed successfully."))
         return super(PhotoEditTagsRedirectView, self).get_redirect_url(*args, **kwargs)
 
@@ -880,21 +888,18 @@ class CoverBase(ServiceClientMixin, TemplateView):
     reverse_url = None
     active_section = ''
 
-    def get_editable_item(self):
-        return self.get_client_restore_action(action=self.editable_item_action)(self.kwargs['pk'])
-
-    def get_cover_item(self):
+    def get_context_data(self, **kwargs):
         """
-        Gets the photo selected to be the cover
+        Gets the editable item and its cover photo at the same time
         """
-        return self.get_client_restore_action(action=self.cover_item_action)(self.kwargs['cover'])
-
-    def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        editable_item = self.get_editable_item()
+        editable_item, cover_item = self.get_client().gather(
+            (self.editable_item_action, (self.kwargs['pk'], )),
+            (self.cover_item_action, (self.kwargs['cover'], )),
+        )
         context.update({
             'editable_item': editable_item,
-            'cover_item': self.get_cover_item(),
+            'cover_item': cover_item,
             'active_section': self.active_section,
             'page_breadcrumbs': self.get_breadcrumbs(editable_item['title']),
         })
@@ -1065,7 +1070,7 @@ class PhotoDetailView(BaseDetailView):
         if context['instance']['upload_status'] == UploadStatus.uploading:
             raise Http404('Photo is being uploaded.')
 
-        self.get_client().logger_view({'photo': self.kwargs['pk']})
+        self.get_client().defer('logger_view', {'photo': self.kwargs['pk']})
         context.update({
             'google_maps_api_key': settings.GEOPOSITION_GOOGLE_MAPS_API_KEY,
             'photo_detail_page': True,
@@ -1078,28 +1083,38 @@ class DetailWithPhotoBase(PaginatorMixin, BaseDetailView):
     Base view to show information and the list of photos of this album or gallery
     """
     filter_photo_field = None
+    photo_list = None
 
     def get_filter_field(self):
         if not self.filter_photo_field:
             raise NotImplementedError
         return self.filter_photo_field
 
-    def get_photo_list(self):
+    def get_photo_list_filters(self):
         """
-        Get list of photos, filtering by album or gallery and page
+        Filters of the list of photos: album or gallery and page
         """
-        filters = {
-            self.get_filter_field(): self.instance.get('id'),
+        return {
+            self.get_filter_field(): self.kwargs['pk'],
             'page': self.get_current_page()
         }
-        return self.get_client().get_photos_list(**filters)
+
+    def get_object(self):
+        """
+        Gets the object and its list of photos at the same time, as both only depend on the object id
+        """
+        instance, self.photo_list = self.get_client().gather(
+            (self.get_restore_action_name(), (self.kwargs['pk'], )),
+            ('get_photos_list', (), self.get_photo_list_filters()),
+        )
+        return instance
 
     def get_context_data(self, **kwargs):
         """
         Before rendering template, requests information about photos of the current album
         """
         context = super().get_context_data(**kwargs)
-        response = self.get_photo_list()
+        response = self.photo_list
         context.update({
             'page': self.paginate(response['count'], response['per_page']),
             'photo_list': response['results']
@@ -1133,7 +1148,7 @@ class PhotoDownloadLogView(LoggedServiceMixin, View):
         """
         Post to register when a user downloads a photo
         """
-        self.get_client().logger_download({'photo': self.kwargs['pk']})
+        self.get_client().defer('logger_download', {'photo': self.kwargs['pk']})
         return JsonResponse(data="", safe=False)
 
 
@@ -1188,9 +1203,9 @@ class UserEditView(BaseEditView):
         After editing a user, reset the cached information
         """
         cache_key = "{}_{}".format(CACHE_USER_PROFILE_PREFIX_KEY, self.request.user.id)
-        user_params = cache.get(cache_key)
+        user_params = dict(tiered_get(CACHE_USER_PROFILE_PREFIX_KEY, cache_key))
         user_params.update({'first_name': data['first_name'], 'last_name': data['last_name']})
-        cache_set(cache_key, user_params)
+        tiered_set(CACHE_USER_PROFILE_PREFIX_KEY, cache_key, user_params, invalidate=True)
 
     def get_breadcrumbs(self):
         return [{'label': _('Manage Users'), 'view': 'user_manage'}, {'label': _('Edit'), 'view': 'user_edit'}]
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+from datetime import datetime
+import logging
+import time
+
+from django.conf import settings
+
+from .authenticate import WSAuthenticationBackend
+from .constants import DEFAULT_CACHE_WARMING
+from .service import DAMWebService, ServiceRequest
+
+
+logger = logging.getLogger(__name__)
+
+
+# Cache warming: requests through the cache the reference data (category trees, flat categories, photo types and
+# groups) and the first pages of the public album, for every language and service identity of WS_CACHE_WARMING.
+# A service identity is the api token of a service user whose groups and permissions are the ones of a role, so the
+# cached responses are shared with the users of that role. Only the missing or expired entries are requested, at no
+# more than `max_rate` requests per second, so a run does not compete with the user traffic.
+
+WarmedEntry = namedtuple('WarmedEntry', ['user_id', 'language', 'action', 'params', 'requested', 'duration', 'error'])
+
+
+class WarmingReport(object):
+    """
+    What a warming run requested, and how long it took
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.started_at = time.time()
+        self.duration = None
+
+    def add(self, entry):
+        self.entries.append(entry)
+
+    def finish(self):
+        self.duration = time.time() - self.started_at
+        return self
+
+    @property
+    def requested(self):
+        return [entry for entry in self.entries if entry.requested and not entry.error]
+
+    @property
+    def errors(self):
+        return [entry for entry in self.entries if entry.error]
+
+    def __str__(self):
+        lines = ["{} {} {} {}: {} in {:.3f}s".format(
+            entry.user_id, entry.language, entry.action, entry.params,
+            entry.error or ('warmed' if entry.requested else 'cached'), entry.duration)
+            for entry in self.entries]
+        lines.append("{} entries, {} warmed, {} errors in {:.3f}s".format(
+            len(self.entries), len(self.requested), len(self.errors), self.duration or 0))
+        return "\n".join(lines)
+
+
+def get_warming_options():
+    """
+    Returns the cache warming options: the defaults updated with the WS_CACHE_WARMING setting
+    """
+    options = dict(DEFAULT_CACHE_WARMING)
+    options.update(getattr(settings, 'WS_CACHE_WARMING', {}))
+    if options['languages'] is None:
+        options['languages'] = [code for code, name in settings.LANGUAGES]
+    return options
+
+
+def get_warming_requests(options):
+    """
+    Returns the (action, params) tuples to warm for each language and identity
+    """
+    requests = [(action, dict(params)) for action, params in options['requests']]
+    requests += [('get_public_photos_list', {'page': page}) for page in range(1, options['public_album_pages'] + 1)]
+    return requests
+
+
+def warm_client(client, requests, report, min_interval):
+    """
+    Requests the actions through the cache with the client of a service identity and language, waiting
+    `min_interval` seconds after each request to the api
+    """
+    for action, params in requests:
+        client.reset_transport_status_code()
+        start, error = time.time(), None
+        try:
+            getattr(client, action)(**dict(params))
+        except Exception as e:
+            logger.warning("Cache warming of %s %s failed: %r", action, params, e)
+            error = str(e) or e.__class__.__name__
+        requested = client.transport_status_code is not None
+        report.add(WarmedEntry(client.user_id, client.language, action, params, requested, time.time() - start, error))
+        if requested:
+            time.sleep(min_interval)
+
+
+def warm_cache(options=None):
+    """
+    Warms the cache for every service identity and language
+    :param options: cache warming options, the ones of get_warming_options by default
+    :return: WarmingReport
+    """
+    options = options or get_warming_options()
+    requests = get_warming_requests(options)
+    min_interval = 1.0 / options['max_rate'] if options['max_rate'] else 0
+    report = WarmingReport()
+    for token in options['tokens']:
+        try:
+            user_id = WSAuthenticationBackend.load_user_profile(token)['id']
+        except Exception as e:
+            logger.warning("Cache warming identity could not be loaded: %r", e)
+            report.add(WarmedEntry(None, None, 'load_user_profile', {}, True, 0, str(e) or e.__class__.__name__))
+            continue
+        for language in options['languages']:
+            warm_client(DAMWebService(ServiceRequest(user_id, language)), requests, report, min_interval)
+    logger.info("Cache warming run: %s", report.finish())
+    return report
+
+
+def schedule_cache_warming(interval=None):
+    """
+    Schedules the cache warming job every `interval` seconds (the WS_CACHE_WARMING one by default) in the rq 'back'
+    queue, replacing the previous schedule. Requires rq-scheduler.
+    """
+    import django_rq
+    from .tasks import warm_cache_job
+
+    scheduler = django_rq.get_scheduler('back')
+    for scheduled_job in scheduler.get_jobs():
+        if scheduled_job.func_name == warm_cache_job.__module__ + '.' + warm_cache_job.__name__:
+            scheduler.cancel(scheduled_job)
+    return scheduler.schedule(scheduled_time=datetime.utcnow(), func=warm_cache_job,
+                              interval=interval or get_warming_options()['interval'], repeat=None)
@@ -16,6 +16,7 @@ INSTALL_REQUIRES = [
     'django_select2>=5.8.8,<5.11',
     'django-widget-tweaks>=1.4.1,<1.5',
     'pytz>=2016.6.1',
+    'requests>=2.10,<3',
     'serpy>=0.1.1,<1.2',
 ]
 
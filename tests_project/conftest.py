@@ -0,0 +1,70 @@
+# -*- encoding: utf-8 -*-
+from coreapi.codecs import CoreJSONCodec
+from django.core.cache import cache
+import pytest
+
+from bima_back import cache_serializers, local_cache, resilience, schemas, transports, utils
+from bima_back.constants import CACHE_USER_PROFILE_PREFIX_KEY, PRIVATE_API_SCHEMA_URL, PUBLIC_API_SCHEMA_URL
+from bima_back.service import DAMWebService, ServiceRequest
+
+from .fake_api import API_URL, FakeApi, build_schema, page
+
+
+@pytest.fixture(autouse=True)
+def service_settings(settings, monkeypatch):
+    """
+    Enables a local memory cache and isolates the process-wide state of the service clients of every test
+    """
+    settings.CACHE_ENABLED = True
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    settings.WS_BASE_URL = API_URL
+    settings.WS_RETRY_BACKOFF = 0
+    for module, name, value in (
+            (transports, '_sessions', {}), (transports, '_executor', None), (transports, '_deferred_executor', None),
+            (resilience, '_circuit_breakers', {}), (resilience, '_hedge_policies', {}), (resilience, '_bulkheads', {}),
+            (schemas, '_indexes', {}), (schemas, '_public_index', (0, None)), (utils, '_generations', {}),
+            (local_cache, '_local_caches', {}), (cache_serializers, '_serializers', {})):
+        monkeypatch.setattr(module, name, value)
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """
+    Fake api mounted in the pooled sessions, which serves the private and public schemas
+    """
+    fake_api = FakeApi()
+    schema = CoreJSONCodec().encode(build_schema())
+    fake_api.route('GET', '/' + PRIVATE_API_SCHEMA_URL, schema, content_type='application/coreapi+json')
+    fake_api.route('GET', '/' + PUBLIC_API_SCHEMA_URL, schema, content_type='application/coreapi+json')
+    for name in ('photos', 'albums', 'galleries', 'categories', 'categories-level', 'types', 'groups', 'logger',
+                 'search'):
+        fake_api.route('GET', '/{}/'.format(name), page([]))
+
+    build_session = transports.build_session
+
+    def build_fake_session(name=None):
+        session = build_session(name)
+        session.mount(API_URL, fake_api)
+        return session
+
+    monkeypatch.setattr(transports, 'build_session', build_fake_session)
+    return fake_api
+
+
+@pytest.fixture
+def make_client(api):
+    """
+    Returns a function which builds the service client of a user, whose profile is stored in cache
+    """
+
+    def make_client(user_id=1, language='en', groups=(1, ), **profile):
+        user_params = {'id': user_id, 'token': 'token{}'.format(user_id), 'dam_groups': list(groups),
+                       'permissions': {}, 'is_superuser': False}
+        user_params.update(profile)
+        utils.cache_set("{}_{}".format(CACHE_USER_PROFILE_PREFIX_KEY, user_id), user_params)
+        return DAMWebService(ServiceRequest(user_id, language))
+
+    return make_client
@@ -0,0 +1,161 @@
+# -*- encoding: utf-8 -*-
+from http.client import HTTPMessage, responses
+import json
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from coreapi import Document, Field, Link
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from bima_back.constants import PRIVATE_API_SCHEMA_URL
+
+
+API_URL = 'http://api.test/'
+
+
+class RawResponse(object):
+    """
+    The part of the urllib3 response which requests reads the cookies from
+    """
+
+    def __init__(self, headers):
+        message = HTTPMessage()
+        for name, value in headers.items():
+            message[name] = value
+        self._original_response = type('OriginalResponse', (object, ), {'msg': message})
+
+    def close(self):
+        pass
+
+
+class FakeApi(BaseAdapter):
+    """
+    Requests adapter which answers the api requests from its routes, without any network. A route answers with a
+    json body, or with a callable which receives the request and returns the status and the body.
+    The requests received are kept in `requests`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.routes = {}
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def route(self, method, path, body=None, status=200, delay=0, headers=None, content_type='application/json'):
+        self.routes[method.upper(), path] = (body, status, delay, headers or {}, content_type)
+
+    def send(self, request, **kwargs):
+        path = urlsplit(request.url).path
+        with self.lock:
+            self.requests.append(request)
+        body, status, delay, headers, content_type = self.routes.get(
+            (request.method, path), ({'detail': 'Not found.'}, 404, 0, {}, 'application/json'))
+        time.sleep(delay)
+        if callable(body):
+            status, body = body(request)
+
+        response = requests.Response()
+        response.status_code = status
+        response.reason = responses.get(status, '')
+        response.url = request.url
+        response.request = request
+        response.headers = CaseInsensitiveDict(headers)
+        response.headers.setdefault('Content-Type', content_type)
+        response.raw = RawResponse(headers)
+        if body is None:
+            response._content = b''
+        else:
+            response._content = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+        return response
+
+    def close(self):
+        pass
+
+    def get_requests(self, path, method='GET'):
+        return [request for request in self.requests if request.method == method and
+                urlsplit(request.url).path == path]
+
+    def count(self, path, method='GET'):
+        return len(self.get_requests(path, method))
+
+    @staticmethod
+    def get_query(request):
+        return parse_qs(urlsplit(request.url).query)
+
+
+def query_fields(*names):
+    return [Field(name, required=False, location='query') for name in names]
+
+
+def build_schema(*extra_resources):
+    """
+    Api schema with the actions used by the tests, and the list, read and update actions of the extra resources
+    """
+    list_fields = query_fields('page', 'id', 'status', 'album', 'gallery', 'q', 'root', 'parent')
+    read_fields = [Field('id', required=True, location='path')]
+    update_fields = read_fields + [Field('title', required=False, location='form')]
+
+    def resource(name, **extra):
+        links = {
+            'list': Link(url=API_URL + name + '/', action='get', fields=list_fields),
+            'read': Link(url=API_URL + name + '/{id}/', action='get', fields=read_fields),
+            'partial_update': Link(url=API_URL + name + '/{id}/', action='patch', fields=update_fields),
+        }
+        links.update(extra)
+        return links
+
+    content = {name: resource(name) for name in extra_resources}
+    content.update({
+        'photos': resource('photos', addition={
+            'partial_update': Link(url=API_URL + 'photos/{id}/addition/', action='patch', fields=update_fields),
+        }),
+        'albums': resource('albums'),
+        'galleries': resource('galleries'),
+        'categories': resource('categories'),
+        'categories-level': resource('categories-level'),
+        'types': resource('types'),
+        'groups': resource('groups'),
+        'logger': resource('logger'),
+        'search': resource('search'),
+        'whoami': resource('whoami'),
+    })
+    return Document(url=API_URL + PRIVATE_API_SCHEMA_URL, title='api', content=content)
+
+
+def page(results, next_page=None, count=None):
+    return {'count': len(results) if count is None else count, 'next': next_page, 'previous': None,
+            'results': results}
+
+
+def logger_pages(pages, fail_page=None):
+    """
+    Route body which answers the logger list with `pages` pages of two entries, and a 503 for `fail_page`
+    """
+    def answer(request):
+        number = int(FakeApi.get_query(request)['page'][0])
+        if number == fail_page:
+            return 503, {}
+        results = [{'id': number * 10 + item, 'photo': number} for item in range(2)]
+        return 200, page(results, next_page='next' if number < pages else None)
+    return answer
+
+
+def run_concurrently(func, callers=8):
+    """
+    Calls the function from several threads at the same time and returns their results
+    """
+    barrier, results = threading.Barrier(callers), []
+
+    def call():
+        barrier.wait()
+        results.append(func())
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
@@ -0,0 +1,82 @@
+# -*- encoding: utf-8 -*-
+import time
+
+from django.core.cache import cache
+
+from bima_back.utils import ComputedValue, cache_get_or_compute, cache_set, get_generation_key, get_lease_key, \
+    get_namespaced_key, invalidate_namespace
+
+from .fake_api import run_concurrently
+
+
+def test_cache_get_or_compute_computes_once(settings):
+    """
+    Concurrent callers of a missing key compute it once: the others wait for the value of the lease holder.
+    """
+    settings.WS_CACHE_LEASE_WAIT = 5
+    computations = []
+
+    def compute():
+        computations.append(1)
+        time.sleep(0.2)
+        return 'value'
+
+    results = run_concurrently(lambda: cache_get_or_compute('computed', compute, 60))
+    assert results == ['value'] * 8
+    assert len(computations) == 1
+
+
+def test_cache_get_or_compute_serves_stale_while_leased():
+    """
+    An expired value is served as it is while another node holds the lease of its key.
+    """
+    cache_set('computed', ComputedValue('stale', 0.1, time.time() - 1), 60)
+    cache.add(get_lease_key('computed'), 1, 10)
+
+    def compute():
+        raise AssertionError('Computed while the lease is held')
+
+    assert cache_get_or_compute('computed', compute, 60, stale_ttl=60) == 'stale'
+
+
+def test_cache_get_or_compute_recomputes_early(settings):
+    """
+    A value close to its expiration, compared with the time it took to compute, is recomputed before it expires.
+    """
+    settings.WS_CACHE_EARLY_BETA = 1000
+    cache_set('computed', ComputedValue('old', 10, time.time() + 1), 60)
+    assert cache_get_or_compute('computed', lambda: 'new', 60) == 'new'
+
+    settings.WS_CACHE_EARLY_BETA = 0
+    cache_set('computed', ComputedValue('old', 1, time.time() + 1), 60)
+    assert cache_get_or_compute('computed', lambda: 'new', 60) == 'old'
+
+
+def test_invalidate_namespace_changes_its_keys():
+    """
+    Invalidating a namespace changes its keys and no other, and a lost generation never restarts from a used one.
+    """
+    key, other_key = get_namespaced_key('photos', 'list'), get_namespaced_key('albums', 'list')
+    invalidate_namespace('photos')
+    assert get_namespaced_key('photos', 'list') != key
+    assert get_namespaced_key('albums', 'list') == other_key
+
+    key = get_namespaced_key('photos', 'list')
+    cache.delete(get_generation_key('photos'))
+    time.sleep(0.01)
+    invalidate_namespace('photos')
+    assert get_namespaced_key('photos', 'list') != key
+
+
+def test_photo_writes_invalidate_cached_photo_lists(api, make_client):
+    """
+    The cached photo lists are requested again after a photo is updated.
+    """
+    api.route('PATCH', '/photos/1/', {'id': 1})
+    for _ in range(2):
+        make_client().get_public_photos_list(page=1)
+    assert api.count('/photos/') == 1
+
+    make_client().update_photo({'id': 1, 'title': 'title'})
+    make_client().get_public_photos_list(page=1)
+    assert api.count('/photos/') == 2
@@ -0,0 +1,56 @@
+# -*- encoding: utf-8 -*-
+from django.core.cache import cache
+import pytest
+
+from bima_back import cache_serializers
+from bima_back.cache_serializers import CompactSerializer, HEADER, FORMAT_COREJSON, FORMAT_JSON, FORMAT_PICKLE, \
+    COMPRESSION_NONE, COMPRESSION_ZLIB
+from bima_back.records import Photo
+from bima_back.utils import cache_get, cache_set
+
+from .fake_api import build_schema
+
+
+def test_cache_get_reads_values_without_serializer_header():
+    """
+    Values stored in cache before the serializer, without its header, are returned as they are.
+    """
+    cache.set('plain', {'id': 1, 'title': 'title'})
+    cache.set('text', 'text')
+    assert cache_get('plain') == {'id': 1, 'title': 'title'}
+    assert cache_get('text') == 'text'
+
+
+@pytest.mark.parametrize('value, value_format', [
+    ({'id': 1, 'title': 'títol', 'tags': [1, None, True]}, FORMAT_JSON),
+    (build_schema(), FORMAT_COREJSON),
+    (Photo({'id': 1}), FORMAT_PICKLE),
+    ({1: 'non string key'}, FORMAT_PICKLE),
+])
+def test_values_round_trip_in_their_format(value, value_format):
+    """
+    Plain data is stored as json, schemas as CoreJSON and the rest with pickle, and all of them are read back equal.
+    """
+    data = CompactSerializer().dumps(value)
+    assert HEADER.unpack_from(data)[2] == value_format
+    assert CompactSerializer().loads(data) == value
+
+
+def test_large_values_are_compressed(settings):
+    """
+    Values over WS_CACHE_COMPRESS_MIN_SIZE bytes are compressed, and the stored bytes are counted by namespace.
+    """
+    settings.WS_CACHE_COMPRESS_MIN_SIZE = 100
+    serializer = CompactSerializer()
+    small, large = {'title': 'title'}, {'title': 'title' * 100}
+    assert HEADER.unpack_from(serializer.dumps(small))[3] == COMPRESSION_NONE
+    data = serializer.dumps(large)
+    assert HEADER.unpack_from(data)[3] == COMPRESSION_ZLIB
+    assert len(data) < 100
+    assert serializer.loads(data) == large
+
+    cache_set('serialized_1', large)
+    assert cache_get('serialized_1') == large
+    stats = cache_serializers.get_cache_stats()['serialized']
+    assert stats['writes'] == stats['reads'] == 1
+    assert stats['write_bytes'] == stats['read_bytes'] < 100
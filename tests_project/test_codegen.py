@@ -0,0 +1,66 @@
+# -*- encoding: utf-8 -*-
+import sys
+
+from coreapi.codecs import CoreJSONCodec
+from django.core.management import call_command, CommandError
+import pytest
+
+from bima_back.checks import check_api_client_module
+from bima_back.constants import PRIVATE_API_SCHEMA_URL
+from bima_back.management.commands.generate_api_client import Command
+from bima_back.schemas import get_schema_signature
+
+from .fake_api import build_schema, page
+
+
+@pytest.fixture
+def client_module(tmp_path, monkeypatch, settings):
+    """
+    Client module generated from the test schema, set as WS_API_CLIENT_MODULE
+    """
+    schema_file = tmp_path / 'schema.json'
+    schema_file.write_bytes(CoreJSONCodec().encode(build_schema()))
+    call_command(Command(), str(tmp_path / 'api_client.py'), schema_file=str(schema_file))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'api_client', raising=False)
+    settings.WS_API_CLIENT_MODULE = 'api_client'
+    return tmp_path
+
+
+def test_generated_client_module_replaces_schema_requests(api, make_client, client_module):
+    """
+    The generated module holds the links of the schema, and the clients dispatch through it without requesting the
+    schema.
+    """
+    import api_client
+
+    assert api_client.SCHEMA_SIGNATURE == get_schema_signature(build_schema())
+    assert get_schema_signature(api_client.get_schema()) == api_client.SCHEMA_SIGNATURE
+
+    api.route('GET', '/photos/', page([{'id': 1}]))
+    assert make_client().get_photos_list(page=1)['results'][0]['id'] == 1
+    assert api.count('/' + PRIVATE_API_SCHEMA_URL) == 0
+
+
+def test_check_fails_when_module_is_out_of_date(client_module):
+    """
+    The --check option passes while the module matches the schema, and fails once the schema changes.
+    """
+    module_path, schema_file = str(client_module / 'api_client.py'), client_module / 'schema.json'
+    call_command(Command(), module_path, schema_file=str(schema_file), check=True)
+
+    schema_file.write_bytes(CoreJSONCodec().encode(build_schema('tags')))
+    with pytest.raises(CommandError):
+        call_command(Command(), module_path, schema_file=str(schema_file), check=True)
+
+
+def test_deploy_check_warns_when_live_schema_changes(api, client_module, settings):
+    """
+    The deploy check compares the live schema with the generated module, and warns when they differ.
+    """
+    settings.WS_SCHEMA_CHECK_TOKEN = 'token'
+    assert check_api_client_module(None) == []
+
+    api.route('GET', '/' + PRIVATE_API_SCHEMA_URL, CoreJSONCodec().encode(build_schema('tags')),
+              content_type='application/coreapi+json')
+    assert [warning.id for warning in check_api_client_module(None)] == ['bima_back.W001']
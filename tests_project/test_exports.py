@@ -0,0 +1,20 @@
+# -*- encoding: utf-8 -*-
+import csv
+
+from bima_back.exports import LogReport
+
+from .fake_api import logger_pages
+
+
+def test_log_report_ends_with_error_row(api, make_client, settings):
+    """
+    The csv export streams the logs of every page, and ends with an error row when a page fails.
+    """
+    settings.WS_RETRY_ATTEMPTS = 0
+    api.route('GET', '/logger/', logger_pages(3, fail_page=2))
+    report = LogReport(data=make_client().iter_all('get_log_list'))
+
+    rows = list(csv.reader(report.stream()))
+    assert [row[0] for row in rows[1:3]] == ['1', '1']
+    assert rows[-1][0] == 'Error: the export is incomplete'
+    assert len(rows) == 4
@@ -0,0 +1,61 @@
+# -*- encoding: utf-8 -*-
+import time
+
+from django.core.cache import cache
+
+from bima_back.constants import CACHE_USER_PROFILE_PREFIX_KEY
+from bima_back.local_cache import get_version_key, tiered_delete, tiered_get, tiered_set, LocalCache
+from bima_back.utils import bump_version, cache_set
+
+
+def test_local_cache_evicts_least_recently_used_and_expired():
+    """
+    The local cache keeps up to max_size entries, evicting the least recently used, and drops the expired ones.
+    """
+    local_cache = LocalCache(2, 0.1)
+    local_cache.set('a', 1)
+    local_cache.set('b', 2)
+    assert local_cache.get('a')[2] == 1
+    local_cache.set('c', 3)
+    assert local_cache.get('b') is None
+    assert [local_cache.get(key)[2] for key in ('a', 'c')] == [1, 3]
+
+    time.sleep(0.15)
+    assert [local_cache.get(key, 'expired') for key in ('a', 'c')] == ['expired', 'expired']
+    assert not local_cache.entries
+
+
+def test_invalidation_drops_only_its_key(settings):
+    """
+    A value replaced by another process is read again once its version is checked, while the other keys of the
+    namespace are still served from the local tier.
+    """
+    settings.WS_GENERATION_CHECK_INTERVAL = 0
+    namespace = CACHE_USER_PROFILE_PREFIX_KEY
+    tiered_set(namespace, 'user_1', {'id': 1})
+    tiered_set(namespace, 'user_2', {'id': 2})
+
+    # writes of another process: the new value of user_1 bumps its version, the one of user_2 does not
+    cache_set('user_1', {'id': 1, 'name': 'new'})
+    bump_version(get_version_key('user_1'))
+    cache_set('user_2', {'id': 2, 'name': 'new'})
+
+    assert tiered_get(namespace, 'user_1') == {'id': 1, 'name': 'new'}
+    assert tiered_get(namespace, 'user_2') == {'id': 2}
+
+
+def test_tiered_set_and_delete_invalidate_their_key(settings):
+    """
+    Replacing or deleting a value bumps the version of its key, so the copies of other processes are dropped.
+    """
+    namespace = CACHE_USER_PROFILE_PREFIX_KEY
+    tiered_set(namespace, 'user_1', {'id': 1})
+    assert tiered_get(namespace, 'user_1') == {'id': 1}
+
+    tiered_set(namespace, 'user_1', {'id': 1, 'name': 'new'}, invalidate=True)
+    version = cache.get(get_version_key('user_1'))
+    assert version is not None
+    assert tiered_get(namespace, 'user_1') == {'id': 1, 'name': 'new'}
+    tiered_delete(namespace, 'user_1')
+    assert tiered_get(namespace, 'user_1') is None
+    assert cache.get(get_version_key('user_1')) == version + 1
@@ -0,0 +1,71 @@
+# -*- encoding: utf-8 -*-
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.views.generic import View
+import pytest
+
+from bima_back.constants import CACHE_SCHEMA_PREFIX_KEY, CACHE_USER_PROFILE_PREFIX_KEY
+from bima_back.local_cache import tiered_get
+from bima_back.middleware import CachePrefetchMiddleware
+from bima_back.schemas import get_user_schema_key
+from bima_back.utils import cache_set, get_generation_key, get_known_generation, get_prefetched
+
+
+class PhotosView(View):
+    cache_namespaces = ('photos', )
+
+
+@pytest.fixture
+def cache_reads(monkeypatch):
+    """
+    Records the reads of the shared cache: the list of keys of each one
+    """
+    reads, get = [], cache.get
+
+    def record_get(key, *args, **kwargs):
+        reads.append([key])
+        return get(key, *args, **kwargs)
+
+    def record_get_many(keys, *args, **kwargs):
+        reads.append(list(keys))
+        return {key: value for key, value in ((key, get(key)) for key in keys) if value is not None}
+
+    monkeypatch.setattr(cache, 'get', record_get)
+    monkeypatch.setattr(cache, 'get_many', record_get_many)
+    return reads
+
+
+def process_request(middleware):
+    request = RequestFactory().get('/')
+    request.session = {SESSION_KEY: '1'}
+    middleware.process_view(request, PhotosView.as_view(), (), {})
+    return request
+
+
+def test_request_keys_are_read_at_once(cache_reads):
+    """
+    The profile and schema pointer of the user, their versions and the generations of the view namespaces are read
+    with a single get_many, and the reads of the request take them from that batch, the missing ones too. The keys
+    kept in process are not read again by the next requests.
+    """
+    profile_key, schema_key = "{}_1".format(CACHE_USER_PROFILE_PREFIX_KEY), get_user_schema_key(1)
+    cache_set(profile_key, {'id': 1})
+    cache_set(schema_key, 'content_hash')
+    cache.set(get_generation_key('photos'), 5)
+    middleware = CachePrefetchMiddleware(lambda request: HttpResponse())
+
+    request = process_request(middleware)
+    assert cache_reads == [[profile_key, 'version_' + profile_key, schema_key, 'version_' + schema_key,
+                            'generation_photos']]
+    assert tiered_get(CACHE_USER_PROFILE_PREFIX_KEY, profile_key) == {'id': 1}
+    assert tiered_get(CACHE_SCHEMA_PREFIX_KEY, schema_key) == 'content_hash'
+    assert tiered_get(CACHE_SCHEMA_PREFIX_KEY, 'missing') is None
+    assert get_known_generation('photos') == 5
+    assert cache_reads[1:] == [['missing', 'version_missing']]
+
+    middleware.process_response(request, HttpResponse())
+    assert get_prefetched() == {}
+    process_request(middleware)
+    assert len(cache_reads) == 2
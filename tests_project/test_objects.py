@@ -0,0 +1,74 @@
+# -*- encoding: utf-8 -*-
+import pytest
+
+from bima_back.service import ServiceClientException
+
+from .fake_api import page, FakeApi
+
+
+def test_objects_with_user_permissions_are_kept_by_user(api, make_client):
+    """
+    Photos, whose responses hold the permissions of the user on them, are cached by user, while categories are
+    shared by the users with the same language and permissions.
+    """
+    api.route('GET', '/photos/1/', lambda request: (200, {
+        'id': 1, 'permissions': {'write': request.headers['Authorization'] == 'Token token1'}}))
+    api.route('GET', '/categories/1/', {'id': 1, 'name': 'category'})
+
+    assert make_client(user_id=1).get_photo(1)['permissions'] == {'write': True}
+    assert make_client(user_id=2).get_photo(1)['permissions'] == {'write': False}
+    assert make_client(user_id=1).get_photo(1)['permissions'] == {'write': True}
+    assert api.count('/photos/1/') == 2
+
+    make_client(user_id=1).get_category(1)
+    make_client(user_id=2).get_category(1)
+    assert api.count('/categories/1/') == 1
+
+
+def test_update_evicts_object(api, make_client):
+    """
+    Updating an object evicts it from cache, so the next read requests it again.
+    """
+    api.route('GET', '/photos/1/', {'id': 1, 'title': 'title'})
+    api.route('PATCH', '/photos/1/', {'id': 1, 'title': 'new title'})
+    client = make_client()
+
+    client.get_photo(1)
+    make_client().get_photo(1)
+    client.update_photo({'id': 1, 'title': 'new title'})
+    make_client().get_photo(1)
+    assert api.count('/photos/1/') == 2
+
+
+def test_missing_objects_are_cached(api, make_client):
+    """
+    A 404 response is cached and raised again without requesting the object.
+    """
+    for _ in range(2):
+        with pytest.raises(ServiceClientException) as error:
+            make_client().get_photo(9)
+        assert error.value.code_error == 404
+    assert api.count('/photos/9/') == 1
+
+
+def test_get_many_keeps_input_order(api, make_client, settings):
+    """
+    get_many returns the objects in the order of the given ids, whether cached or requested in concurrent chunks,
+    without duplicates and leaving out the missing ones.
+    """
+    settings.WS_GET_MANY_CHUNK_SIZE = 1
+    api.route('GET', '/photos/2/', {'id': 2, 'title': 'cached'})
+    api.route('GET', '/photos/', lambda request: (200, page([
+        {'id': int(object_id), 'title': object_id} for object_id in FakeApi.get_query(request).get('id', ())
+        if object_id != '4'])))
+    client = make_client()
+    client.get_photo(2)
+
+    photos = client.get_many('photos', [3, 2, 4, 1, 3])
+    assert [photo['id'] for photo in photos] == [3, 2, 1]
+    assert photos[1]['title'] == 'cached'
+    assert sorted(FakeApi.get_query(request)['id'] for request in api.get_requests('/photos/')) == [
+        ['1'], ['3'], ['4']]
+
+    assert [photo['id'] for photo in make_client().get_many('photos', [1, 3])] == [1, 3]
+    assert api.count('/photos/') == 3
@@ -0,0 +1,33 @@
+# -*- encoding: utf-8 -*-
+import pickle
+
+from bima_back.records import to_records, Photo
+from bima_back.utils import cache_get, cache_set, get
+
+
+def test_record_pickle_round_trip():
+    """
+    Records keep their fields, nested values and unknown fields through pickle and the cache.
+    """
+    photo = Photo({'id': 1, 'title': 'title', 'extra_info': {'album': [{'id': 2, 'title': 'album'}]}, 'unknown': 3})
+    cache_set('photo', photo)
+    for restored in (pickle.loads(pickle.dumps(photo, pickle.HIGHEST_PROTOCOL)), cache_get('photo')):
+        assert restored == photo
+        assert get(restored, 'extra_info.album') == [{'id': 2, 'title': 'album'}]
+        assert get(restored, 'title') == 'title'
+        assert get(restored, 'unknown') == 3
+        assert get(restored, 'author', None) is None
+        assert 'author' not in restored
+
+
+def test_to_records_converts_read_and_list_responses():
+    """
+    The objects of the read and list responses of the resources with a record type are returned as records, and the
+    rest of the responses as they are.
+    """
+    assert isinstance(to_records(['photos', 'read'], {'id': 1}), Photo)
+    response = to_records(['search', 'list'], {'count': 1, 'results': [{'id': 1}]})
+    assert isinstance(response['results'][0], Photo)
+    assert response['count'] == 1
+    assert to_records(['users', 'read'], {'id': 1}) == {'id': 1}
+    assert type(to_records(['users', 'read'], {'id': 1})) is dict
@@ -0,0 +1,140 @@
+# -*- encoding: utf-8 -*-
+import threading
+import time
+
+import pytest
+
+from bima_back.resilience import get_hedge_stats
+from bima_back.service import ServiceClientException
+
+from .fake_api import page, run_concurrently
+
+
+def test_circuit_breaker_fails_fast_and_recovers(api, make_client, settings):
+    """
+    The circuit opens when the calls fail, counting one outcome per call after its retries, fails fast while open
+    and lets a single probe through after the recovery timeout, whose success closes it.
+    """
+    settings.WS_RETRY_ATTEMPTS = 1
+    settings.WS_CIRCUIT_BREAKER = {'min_calls': 2, 'recovery_timeout': 0.2}
+    status = {'code': 503}
+    api.route('GET', '/photos/1/', lambda request: (status['code'], {'id': 1}))
+
+    for _ in range(2):
+        with pytest.raises(ServiceClientException):
+            make_client().get_photo(1)
+    assert api.count('/photos/1/') == 4
+
+    with pytest.raises(ServiceClientException) as error:
+        make_client().get_photo(1)
+    assert error.value.code_error == 503
+    assert api.count('/photos/1/') == 4
+
+    time.sleep(0.25)
+    status['code'] = 200
+    assert make_client().get_photo(1)['id'] == 1
+    assert api.count('/photos/1/') == 5
+
+
+def test_client_errors_are_not_retried(api, make_client, settings):
+    """
+    Server errors are retried up to WS_RETRY_ATTEMPTS times, client errors are raised at once.
+    """
+    settings.WS_RETRY_ATTEMPTS = 2
+    responses = [(503, {}), (503, {}), (200, {'id': 1})]
+    api.route('GET', '/photos/1/', lambda request: responses.pop(0))
+    api.route('GET', '/albums/1/', {'detail': 'Not found.'}, status=404)
+    client = make_client()
+
+    assert client.get_photo(1)['id'] == 1
+    assert api.count('/photos/1/') == 3
+    with pytest.raises(ServiceClientException):
+        client.get_album(1)
+    assert api.count('/albums/1/') == 1
+
+
+def test_stale_response_is_kept_by_language(api, make_client, settings):
+    """
+    A read action in WS_STALE_IF_ERROR_ACTIONS falls back to the last successful response of the same user and
+    language while the api fails, never to the one in another language.
+    """
+    settings.WS_RETRY_ATTEMPTS = 0
+    settings.WS_STALE_IF_ERROR_ACTIONS = ('photos.read', )
+    status = {'code': 200}
+    api.route('GET', '/photos/1/', lambda request: (
+        status['code'], {'id': 1, 'title': request.headers['Accept-Language']}))
+
+    assert make_client(language='en').action_or_logout(['photos', 'read'], {'id': 1})['title'] == 'en'
+    status['code'] = 503
+    assert make_client(language='en').action_or_logout(['photos', 'read'], {'id': 1})['title'] == 'en'
+    with pytest.raises(ServiceClientException):
+        make_client(language='ca').action_or_logout(['photos', 'read'], {'id': 1})
+
+
+def answer_after(*answers):
+    """
+    Route body which answers each request with the next (delay, status, body) of the answers
+    """
+    answers, lock = list(answers), threading.Lock()
+
+    def answer(request):
+        with lock:
+            delay, status, body = answers.pop(0)
+        time.sleep(delay)
+        return status, body
+
+    return answer
+
+
+def test_hedge_first_response_wins(api, make_client, settings):
+    """
+    The hedge of a slow request is answered first and wins, without waiting for the slow request.
+    """
+    settings.WS_HEDGE_ACTIONS = {'photos.list': 0.05}
+    settings.WS_HEDGE_MAX_RATIO = 1
+    api.route('GET', '/photos/', answer_after((0.5, 200, page([{'id': 1}])), (0, 200, page([{'id': 2}]))))
+
+    start = time.time()
+    response = make_client().get_photos_list(page=1)
+    assert time.time() - start < 0.4
+    assert response['results'][0]['id'] == 2
+    assert get_hedge_stats()['photos.list']['wins'] == 1
+
+
+def test_hedge_answers_when_first_request_fails(api, make_client, settings):
+    """
+    The response of the hedge is returned when the first request fails, and fast requests are not hedged.
+    """
+    settings.WS_RETRY_ATTEMPTS = 0
+    settings.WS_HEDGE_ACTIONS = {'photos.list': 0.05}
+    settings.WS_HEDGE_MAX_RATIO = 1
+    api.route('GET', '/photos/', answer_after(
+        (0.1, 503, {}), (0.2, 200, page([{'id': 2}])), (0, 200, page([{'id': 3}]))))
+
+    assert make_client().get_photos_list(page=1)['results'][0]['id'] == 2
+    assert make_client().get_photos_list(page=2)['results'][0]['id'] == 3
+    assert api.count('/photos/') == 3
+    assert get_hedge_stats()['photos.list'] == {
+        'requests': 2, 'hedged': 1, 'wins': 1, 'win_rate': 1, 'delay': 0.05}
+
+
+def test_full_bulkhead_fails_fast(api, make_client, settings):
+    """
+    The requests over the limit of a bulkhead fail at once, while the actions of other bulkheads are still sent.
+    """
+    settings.WS_BULKHEADS = {'search': {'max_concurrent': 1}}
+    api.route('GET', '/search/', page([]), delay=0.3)
+    queries = ['first', 'second']
+
+    def search():
+        client = make_client()
+        start = time.time()
+        try:
+            client.search_photos_list(q=queries.pop())
+        except ServiceClientException as e:
+            assert client.get_photos_list(page=1)['results'] == []
+            return e.code_error, time.time() - start < 0.2
+        return 200, True
+
+    assert sorted(run_concurrently(search, callers=2)) == [(200, True), (503, True)]
+    assert api.count('/search/') == 1
@@ -0,0 +1,27 @@
+# -*- encoding: utf-8 -*-
+import time
+
+from bima_back import schemas
+from bima_back.constants import PUBLIC_API_SCHEMA_URL
+from bima_back.service import DAMPublicWebService
+
+from .fake_api import build_schema
+
+
+def test_public_schema_is_loaded_once(api, settings, monkeypatch):
+    """
+    The public schema is requested on first use, not when the service is built, and shared by the services of the
+    process. Once its process TTL expires, or in another process, it is taken from cache.
+    """
+    settings.WS_PUBLIC_SCHEMA_PROCESS_TTL = 0.1
+    service = DAMPublicWebService(None)
+    assert api.count('/' + PUBLIC_API_SCHEMA_URL) == 0
+
+    assert service.schema == build_schema()
+    assert DAMPublicWebService(None).schema_index is service.schema_index
+    assert api.count('/' + PUBLIC_API_SCHEMA_URL) == 1
+
+    time.sleep(0.15)
+    monkeypatch.setattr(schemas, '_indexes', {})
+    assert DAMPublicWebService(None).schema == build_schema()
+    assert api.count('/' + PUBLIC_API_SCHEMA_URL) == 1
@@ -0,0 +1,105 @@
+# -*- encoding: utf-8 -*-
+import time
+
+from django.core.cache import cache
+
+from bima_back.constants import PRIVATE_API_SCHEMA_URL
+from bima_back.utils import get_lease_key, invalidate_namespace, SingleFlight
+
+from .fake_api import logger_pages, page, run_concurrently, FakeApi
+
+
+def test_stale_response_is_served_while_refreshed(api, make_client, settings, monkeypatch):
+    """
+    A cached response past its soft TTL is served as it is and a single refresh is enqueued, holding its lease.
+    The refresh stores the new response and releases the lease it was enqueued with, even when the key of the
+    response changed meanwhile.
+    """
+    settings.WS_CACHE_SOFT_TTL = 0.1
+    settings.WS_CACHE_EARLY_BETA = 0
+    api.route('GET', '/categories/', {'results': [{'id': 1}]})
+    refreshes = []
+    monkeypatch.setattr('bima_back.service.DAMWebService.enqueue_refresh',
+                        lambda client, cache_key, path_list, params: refreshes.append(cache_key))
+
+    make_client().get_categories_list()
+    time.sleep(0.15)
+    api.route('GET', '/categories/', {'results': [{'id': 2}]})
+    for _ in range(2):
+        assert make_client().get_categories_list()['results'][0]['id'] == 1
+    assert len(refreshes) == 1
+    assert cache.get(get_lease_key(refreshes[0])) is not None
+
+    invalidate_namespace('categories')
+    make_client().refresh_cached_response(['categories', 'list'], {}, get_lease_key(refreshes[0]))
+    assert cache.get(get_lease_key(refreshes[0])) is None
+    assert make_client().get_categories_list()['results'][0]['id'] == 2
+    assert api.count('/categories/') == 2
+
+
+def test_single_flight_calls_once():
+    """
+    Concurrent calls with the same key share the result of a single call.
+    """
+    flight, calls = SingleFlight(), []
+
+    def func():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'response'
+
+    results = run_concurrently(lambda: flight.do('key', func))
+    assert results == ['response'] * 8
+    assert len(calls) == 1
+
+
+def test_identical_concurrent_reads_are_coalesced(api, make_client):
+    """
+    Identical reads of the users with the same language at the same time share one request, and the schema is
+    fetched once.
+    """
+    api.route('GET', '/photos/', page([{'id': 1}]), delay=0.2)
+    clients = [make_client() for _ in range(8)]
+
+    results = run_concurrently(lambda: clients.pop().get_photos_list(page=1))
+    assert [response['results'][0]['id'] for response in results] == [1] * 8
+    assert api.count('/photos/') == 1
+    assert api.count('/' + PRIVATE_API_SCHEMA_URL) == 1
+
+
+def test_iter_all_streams_every_page(api, make_client):
+    """
+    iter_all yields the results of every page in order from the given one, requesting each page once.
+    """
+    api.route('GET', '/logger/', logger_pages(3))
+    results = make_client().iter_all('get_log_list', page=2)
+    assert [result['id'] for result in results] == [20, 21, 30, 31]
+    assert sorted(FakeApi.get_query(request)['page'] for request in api.get_requests('/logger/')) == [['2'], ['3']]
+
+
+def test_iter_all_without_prefetch_requests_pages_on_demand(api, make_client):
+    """
+    Without prefetch, the next page is requested only once the results of the previous one are consumed.
+    """
+    api.route('GET', '/logger/', logger_pages(3))
+    results = make_client().iter_all('get_log_list', prefetch=False)
+    assert [next(results)['id'] for _ in range(2)] == [10, 11]
+    assert api.count('/logger/') == 1
+
+
+def test_taxonomy_cache_is_shared_by_language_and_role(api, make_client):
+    """
+    Cached taxonomy responses are shared by the users with the same language and permissions, whatever the order
+    and types of the parameters, and kept apart by language, so each language is requested once.
+    """
+    api.route('GET', '/categories/', lambda request: (
+        200, {'results': [{'id': 1, 'title': request.headers['Accept-Language']}]}))
+
+    def get_title(client, **params):
+        return client.get_categories_list(**params)['results'][0]['title']
+
+    assert get_title(make_client(user_id=1, language='ca-ES,ca;q=0.9'), page=1, id=[2, 1]) == 'ca-ES,ca;q=0.9'
+    assert get_title(make_client(user_id=2, language='ca'), id=['1', '2'], page='1') == 'ca-ES,ca;q=0.9'
+    assert get_title(make_client(user_id=3, language='en'), page=1, id=[1, 2]) == 'en'
+    assert get_title(make_client(user_id=4, groups=(2, ), language='en'), page=1, id=[1, 2]) == 'en'
+    assert api.count('/categories/') == 3
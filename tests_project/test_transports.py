@@ -0,0 +1,38 @@
+# -*- encoding: utf-8 -*-
+import pytest
+
+from bima_back.service import ServiceClientException
+from bima_back.transports import get_session
+
+from .fake_api import page
+
+
+def test_pooled_session_accepts_no_cookies(api, make_client):
+    """
+    A cookie set by the api for a user is not stored by the shared session nor sent for other users.
+    """
+    api.route('GET', '/photos/', page([]), headers={'Set-Cookie': 'sessionid=secret; Path=/'})
+    make_client(user_id=1).get_photos_list(page=1)
+    make_client(user_id=2).get_photos_list(page=1)
+
+    assert len(get_session().cookies) == 0
+    assert all('Cookie' not in request.headers for request in api.get_requests('/photos/'))
+
+
+@pytest.mark.parametrize('fast_path', [False, True])
+def test_error_responses_are_mapped_alike(api, make_client, settings, fast_path):
+    """
+    The coreapi and the direct transports raise the 4xx and 5xx responses as the same service client exception,
+    and return the rest.
+    """
+    settings.WS_RETRY_ATTEMPTS = 0
+    settings.WS_FAST_PATH_ACTIONS = ('photos.list', 'photos.read') if fast_path else ()
+    api.route('GET', '/photos/', {'detail': 'Not found.'}, status=404)
+    api.route('GET', '/photos/1/', {'id': 1}, status=600)
+    client = make_client()
+
+    with pytest.raises(ServiceClientException) as error:
+        client.get_photos_list(page=1)
+    assert error.value.code_error == 404
+    assert error.value.code_text == 'Not Found'
+    assert client.get_photo(1)['id'] == 1
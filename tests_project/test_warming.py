@@ -0,0 +1,50 @@
+# -*- encoding: utf-8 -*-
+from bima_back.warming import get_warming_options, warm_cache
+
+from .fake_api import page
+
+
+def get_options(**options):
+    warming_options = get_warming_options()
+    warming_options.update({'tokens': ['service'], 'languages': ['en'], 'requests': [('get_categories_list', {})],
+                            'public_album_pages': 1, 'max_rate': 0})
+    warming_options.update(options)
+    return warming_options
+
+
+def whoami(user_id=10, groups=(2, )):
+    return {'id': user_id, 'username': 'service', 'first_name': '', 'last_name': '', 'email': '',
+            'groups': list(groups), 'is_superuser': False, 'permissions': {}}
+
+
+def test_warm_cache_is_shared_by_role(api, make_client):
+    """
+    The entries warmed with a service identity are served to the users of the same role, without the permissions of
+    the service identity on the photos, and a second run requests nothing.
+    """
+    api.route('GET', '/whoami/', whoami())
+    api.route('GET', '/photos/', page([{'id': 1, 'permissions': {'update': True}}]))
+
+    report = warm_cache(get_options())
+    assert not report.errors
+    assert len(report.requested) == 2
+
+    photos = make_client(user_id=1, groups=(2, )).get_public_photos_list(page=1)
+    assert [dict(photo) for photo in photos['results']] == [{'id': 1}]
+    assert api.count('/photos/') == 1
+    assert api.count('/categories/') == 1
+
+    assert not warm_cache(get_options()).requested
+
+
+def test_warm_cache_reports_errors(api):
+    """
+    An identity which can not be loaded and a failed request are reported as errors, and the rest is warmed.
+    """
+    api.route('GET', '/whoami/', lambda request: (
+        (200, whoami()) if request.headers['Authorization'] == 'Token service' else (401, {})))
+    api.route('GET', '/categories/', {'detail': 'Error'}, status=400)
+
+    report = warm_cache(get_options(tokens=['expired', 'service']))
+    assert [entry.action for entry in report.errors] == ['load_user_profile', 'get_categories_list']
+    assert [entry.action for entry in report.requested] == ['get_public_photos_list']